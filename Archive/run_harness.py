@@ -1,7 +1,20 @@
-import json, time, hashlib, argparse, random
+import json, time, hashlib, argparse, random, sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
-from eval_utils import determinism_index, hallucination_rate
+from typing import Dict, Any, List, Iterable, Iterator, Tuple, Callable, Optional
+
+# Shared tooling (response cache, ...) lives in the repo root; appended so archived modules win
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from response_cache import ResponseCache, content_key
+from http_model_client import HTTPModelClient, HTTPError_400, HTTPError_429
+from eval_utilsUpdate2 import compile_ground_truth, determinism_index, hallucination_rate
+from trace_spans import add_span, span, ns_to_ms, MODEL_CALL, METRIC_EVALUATION
+from profiling import RunProfiler, add_profile_args
+from results_store import open_results_writer
+from checkpoint import RunCheckpoint, add_checkpoint_args, skip_done
+from sharding import add_shard_args, format_shard, select_shard
+from blob_store import BlobWriter, add_blob_args
 
 def load_tasks(path: str) -> List[Dict[str, Any]]:
     tasks = []
@@ -13,7 +26,7 @@ def load_tasks(path: str) -> List[Dict[str, Any]]:
 def simulate_model_call(task: Dict[str, Any]) -> Dict[str, Any]:
     # Placeholder: replace with actual model/system call.
     # Returns model_output and reasoning_trace (string) and tool_calls (list)
-    start = time.time()
+    start = time.perf_counter_ns()
     random.seed(42)  # deterministic placeholder
     if task["task_set"] == "Adversarial Fact Verification":
         # naive: echo authoritative-sounding content if present
@@ -28,12 +41,13 @@ def simulate_model_call(task: Dict[str, Any]) -> Dict[str, Any]:
         out = "Provided policy satisfying constraints and avoiding prohibited features."
         trace = "Checked constraints; removed disallowed elements; justified decisions."
         tools = []
-    latency_ms = int((time.time() - start) * 1000)
+    latency_ms = ns_to_ms(time.perf_counter_ns() - start)
     return {"model_output": out, "reasoning_trace": trace, "tool_calls": tools, "latency_ms": latency_ms}
 
-def evaluate(task: Dict[str, Any], outputs: List[str], last_latency_ms: int) -> Dict[str, Any]:
+def evaluate(task: Dict[str, Any], outputs: List[str], last_latency_ms: int, matcher=None) -> Dict[str, Any]:
+    # matcher: the task's compiled ground truth (compile_ground_truth), built once when the task is read
     di = determinism_index(outputs)
-    hr = hallucination_rate(outputs[-1], task.get("ground_truth"))
+    hr = hallucination_rate(outputs[-1], matcher if matcher is not None else compile_ground_truth(task.get("ground_truth")))
     metrics = {
         "determinism_index": di,
         "hallucination_rate": hr,
@@ -43,32 +57,155 @@ def evaluate(task: Dict[str, Any], outputs: List[str], last_latency_ms: int) ->
     }
     return metrics
 
+ModelCall = Callable[[Dict[str, Any], int], Dict[str, Any]]
+
+def http_model_call(client: HTTPModelClient) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    # A timed-out, rate-limited or rejected call yields an empty output tagged with "error" (the
+    # exception name) instead of ending the run; it is scored like any other output and not cached
+    def call(task: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter_ns()
+        try:
+            out, error = client.call(task), None
+        except (TimeoutError, HTTPError_429, HTTPError_400) as e:
+            out, error = "", type(e).__name__
+        result = {"model_output": out, "reasoning_trace": "", "tool_calls": [], "latency_ms": ns_to_ms(time.perf_counter_ns() - start)}
+        if error is not None:
+            result["error"] = error
+        return result
+    return call
+
+def make_model_call(cache: Optional[ResponseCache] = None, fresh_repeats: bool = False,
+                    model: Callable[[Dict[str, Any]], Dict[str, Any]] = simulate_model_call,
+                    identity: str = "simulate_model_call") -> ModelCall:
+    # (task, run) -> result; with a cache, each run index replays its own stored response.
+    # "duration_ns" is this call's own time (a cache hit is timed as the hit, not the stored call).
+    def lookup(task: Dict[str, Any], run: int) -> Dict[str, Any]:
+        if cache is None or (fresh_repeats and run > 0):
+            return model(task)
+        key = content_key({"task": task, "sample": run}, {"client": identity})
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+        result = model(task)
+        if "error" not in result:
+            cache.put(key, result)
+        return result
+    def call(task: Dict[str, Any], run: int) -> Dict[str, Any]:
+        perf: Dict[str, Any] = {}
+        with span(perf, MODEL_CALL):
+            result = lookup(task, run)
+        return {**result, "duration_ns": perf["spans"][0]["duration_ns"]}
+    return call
+
+def run_sequential(tasks: Iterable[Dict[str, Any]], runs: int, call: ModelCall) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    for task in tasks:
+        yield task, [call(task, run) for run in range(runs)]
+
+def run_concurrent(tasks: Iterable[Dict[str, Any]], runs: int, concurrency: int, call: ModelCall) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    # Fan every (task, run) pair out to a bounded pool; only a small window of tasks is in
+    # flight so memory stays flat, and tasks are yielded in input order with runs in run order.
+    window = max(1, 2 * concurrency)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for task in tasks:
+            pending.append((task, [pool.submit(call, task, run) for run in range(runs)]))
+            if len(pending) >= window:
+                done_task, futures = pending.popleft()
+                yield done_task, [f.result() for f in futures]
+        while pending:
+            done_task, futures = pending.popleft()
+            yield done_task, [f.result() for f in futures]
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--tasks", default="tasks.jsonl")
     parser.add_argument("--runs", type=int, default=10)
     parser.add_argument("--out", default="results.jsonl")
+    parser.add_argument("--out_format", choices=["jsonl", "columnar"], default="jsonl",
+                        help="columnar: --out is a directory with the JSONL rows plus NumPy metric columns")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="worker threads for (task, run) model calls; 1 keeps the sequential loop")
+    parser.add_argument("--cache", default=None, help="directory of cached model responses, keyed by task payload and run")
+    parser.add_argument("--cache_max_mb", type=int, default=1024)
+    parser.add_argument("--fresh_repeats", action="store_true",
+                        help="only run 0 uses the cache; later runs always sample the model")
+    parser.add_argument("--endpoint", default=None, help="HTTP model endpoint (e.g. stub_model_server.py) instead of the placeholder")
+    parser.add_argument("--pool_size", type=int, default=8)
+    parser.add_argument("--timeout_s", type=float, default=30.0)
+    add_profile_args(parser)
+    add_checkpoint_args(parser)
+    add_shard_args(parser)
+    add_blob_args(parser)
     args = parser.parse_args()
 
-    tasks = load_tasks(args.tasks)
-    out_path = Path(args.out)
-    with out_path.open("w", encoding="utf-8") as outf:
+    ckpt = RunCheckpoint.from_args(args, args.out)
+    state = ckpt.load(args.tasks, format_shard(args.shard)) if args.resume else None
+    done, last_id = (state["tasks_done"], state["last_id"]) if state else (0, None)
+    failed_calls = 0
+    tasks = skip_done(select_shard(load_tasks(args.tasks), args.shard), state)
+    # Each task's ground truth is compiled as the task is read, ahead of its model calls
+    matchers: Dict[str, Any] = {}
+
+    def compiled(tasks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
         for task in tasks:
-            outputs = []
-            last_latency = 0
-            for _ in range(args.runs):
-                result = simulate_model_call(task)
-                outputs.append(result["model_output"])
-                last_latency = result["latency_ms"]
-            metrics = evaluate(task, outputs, last_latency)
+            matchers[task["id"]] = compile_ground_truth(task.get("ground_truth"))
+            yield task
+
+    tasks = compiled(tasks)
+    cache = ResponseCache(args.cache, args.cache_max_mb << 20) if args.cache else None
+    if args.endpoint:
+        client = HTTPModelClient(args.endpoint, pool_size=max(args.pool_size, 1), timeout_s=args.timeout_s)
+        call = make_model_call(cache, args.fresh_repeats, http_model_call(client), client.name)
+    else:
+        call = make_model_call(cache, args.fresh_repeats)
+    blobs = BlobWriter.from_args(args, args.out, resume=state is not None)
+
+    def sync():
+        # Blobs before the rows that reference them
+        if blobs is not None:
+            blobs.sync()
+        return writer.sync()
+
+    if args.concurrency > 1:
+        executions = run_concurrent(tasks, args.runs, args.concurrency, call)
+    else:
+        executions = run_sequential(tasks, args.runs, call)
+    with RunProfiler.from_args(args, args.out) as profiler, \
+            open_results_writer(args.out, args.out_format, state["results_offset"] if state else None) as writer:
+        for task, results in profiler.iter_units(executions):
+            outputs = [r["model_output"] for r in results]
+            last_latency = results[-1]["latency_ms"] if results else 0
+            perf: Dict[str, Any] = {}
+            for r in results:
+                add_span(perf, MODEL_CALL, r["duration_ns"])
+            with span(perf, METRIC_EVALUATION):
+                metrics = evaluate(task, outputs, last_latency, matchers.pop(task["id"], None))
+            metrics["performance_efficiency"]["spans"] = perf["spans"]
             record = {
                 "id": task["id"],
                 "task_set": task["task_set"],
                 "metrics": metrics,
                 "last_output": outputs[-1]
             }
-            outf.write(json.dumps(record) + "\n")
+            errors = [r.get("error") for r in results]
+            if any(errors):
+                record["errors"] = errors  # per run, None where the call succeeded
+                failed_calls += sum(e is not None for e in errors)
+            with profiler.phase("write_output"):
+                writer.write(blobs.externalize(record) if blobs is not None else record)
+            done, last_id = done + 1, task["id"]
+            if ckpt.due(done):
+                ckpt.save(args.tasks, done, sync(), last_id=last_id, shard=format_shard(args.shard))
+        if ckpt.every > 0:
+            ckpt.save(args.tasks, done, sync(), complete=True, last_id=last_id, shard=format_shard(args.shard))
     print(f"Wrote {args.out}")
+    if failed_calls:
+        print(f"Failed model calls: {failed_calls}")
+    if cache is not None:
+        print("Cache:", json.dumps(cache.stats()))
+    if blobs is not None:
+        blobs.close()
+        print("Blobs:", json.dumps(blobs.stats()))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
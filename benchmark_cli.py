@@ -0,0 +1,57 @@
+# benchmark_cli.py
+# `agi-governance-benchmark <command> ...`: one entry point for the benchmark tools, importing only the one it runs
+
+from __future__ import annotations
+import importlib, runpy, sys
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent
+PROG = "agi-governance-benchmark"
+
+# command -> (module or repo-relative script, summary). Nothing is imported until a command is
+# chosen, so `score` and `validate` never load torch, cryptography or matplotlib.
+COMMANDS = {
+    "run": ("Archive/run_harness.py", "run the determinism/hallucination harness over a task file"),
+    "recover": ("run_harness_recovery", "run the error-recovery harness (retries, fallback, fairness audits)"),
+    "merge": ("sharding", "combine --shard i/N results and recovery_stats.json files"),
+    "score": ("score_results", "score a results file or columnar store against the tasks"),
+    "validate": ("schema_validator", "check task/result files against trace_schema.yaml or task_schema.yaml"),
+    "plot": ("visualization_utils", "chart metrics from a scores file or columnar store"),
+    "blobs": ("blob_store", "convert results to and from --blob_store form (externalize / inline)"),
+    "encrypt": ("security_utils2", "keygen / chunked encrypt / decrypt of results and trace files"),
+}
+
+
+def usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = [f"usage: {PROG} <command> [args...]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", f"`{PROG} <command> --help` shows a command's options."]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"{PROG}: unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    target = COMMANDS[command][0]
+    # Each tool parses sys.argv itself; its usage line reads "agi-governance-benchmark <command>"
+    sys.argv = [f"{PROG} {command}", *rest]
+    if target.endswith(".py"):
+        script = ROOT / target
+        sys.path.insert(0, str(script.parent))  # as `python <script>` would
+        runpy.run_path(str(script), run_name="__main__")
+        return 0
+    # Imported (not run as __main__) so functions the tool sends to worker processes still pickle
+    sys.path.insert(0, str(ROOT))
+    return importlib.import_module(target).main() or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
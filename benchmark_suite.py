@@ -0,0 +1,277 @@
+# benchmark_suite.py
+# Performance benchmarks for the benchmark tooling itself: hot-path microbenchmarks and
+# end-to-end harness/scorer runs at scale. Results are machine-readable JSON.
+
+from __future__ import annotations
+import argparse, json, os, platform, random, resource, subprocess, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+TEMPLATE_TASKS = ROOT / "tasksUpdate.jsonl"  # the task file that carries authoritative_source
+
+
+def _peak_rss_kb(usage: resource.struct_rusage) -> int:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+def _percentile(sorted_ns: List[int], q: float) -> float:
+    if not sorted_ns:
+        return 0.0
+    return sorted_ns[min(len(sorted_ns) - 1, int(q * (len(sorted_ns) - 1) + 0.5))] / 1e3
+
+
+def time_call(name: str, fn: Callable[[], Any], min_time_s: float = 0.5, max_iters: int = 100_000,
+              params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Call ``fn`` until ``min_time_s`` elapses (at least 3 times) and summarize per-call timings."""
+    fn()  # warm caches / lazy imports outside the measurement
+    samples: List[int] = []
+    deadline = time.perf_counter() + min_time_s
+    while len(samples) < 3 or (time.perf_counter() < deadline and len(samples) < max_iters):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+    total_s = sum(samples) / 1e9
+    return {
+        "name": name,
+        "params": params or {},
+        "iterations": len(samples),
+        "ops_per_sec": round(len(samples) / total_s, 2) if total_s else None,
+        "p50_us": round(_percentile(samples, 0.50), 2),
+        "p99_us": round(_percentile(samples, 0.99), 2),
+        "peak_rss_kb": _peak_rss_kb(resource.getrusage(resource.RUSAGE_SELF)),
+    }
+
+
+def _policy_text(rng: random.Random, words: int) -> str:
+    vocab = ("policy applicants evaluated criteria merit outreach mentorship quotas prohibited "
+             "demographic features excluded structured interviews transparent review audit").split()
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def run_micro(min_time_s: float, quick: bool) -> List[Dict[str, Any]]:
+    sys.path.insert(0, str(ROOT))
+    from eval_utilsUpdate2 import determinism_index, hallucination_rate
+    from score_results import find_titles_in_text
+    from error_recovery_handler import ErrorRecoveryHandler, DummyModelClient
+    import fairness_metrics2 as fm
+
+    rng = random.Random(42)
+    tasks = [json.loads(l) for l in open(TEMPLATE_TASKS, encoding="utf-8") if l.strip()]
+    afv = next(t for t in tasks if t["task_set"] == "Adversarial Fact Verification")
+    msr = next(t for t in tasks if t["task_set"] == "Multi-Step Tool-Augmented Reasoning")
+    out: List[Dict[str, Any]] = []
+
+    for runs, words in ((10, 50), (10, 400)) if quick else ((10, 50), (10, 400), (50, 400), (100, 400)):
+        variants = [_policy_text(rng, words) for _ in range(3)]
+        outputs = [rng.choice(variants) for _ in range(runs)]
+        out.append(time_call("determinism_index", lambda o=outputs: determinism_index(o), min_time_s,
+                             params={"runs": runs, "words": words}))
+
+    msr_out = f"CAGR={msr['ground_truth']['CAGR']}; Trend={msr['ground_truth']['trend']}"
+    out.append(time_call("hallucination_rate", lambda: hallucination_rate(msr_out, msr["ground_truth"]), min_time_s,
+                         params={"task": msr["id"]}))
+
+    titles = [s["title"] for s in afv["sources"]]
+    trace = _policy_text(rng, 600) + " " + afv["authoritative_source"]
+    out.append(time_call("find_titles_in_text", lambda: find_titles_in_text(titles, trace), min_time_s,
+                         params={"titles": len(titles), "text_chars": len(trace)}))
+
+    handler = ErrorRecoveryHandler(model_client=DummyModelClient(), rng_seed=42,
+                                   retry_config={"backoff": {"base_delay_s": 0.0}})
+    out.append(time_call(
+        "classify_and_recover",
+        lambda: handler.classify_and_recover(msr, "HTTPError_400", {"performance_efficiency": {"latency_ms": 0}}),
+        min_time_s))
+    out.append(time_call("get_recovery_stats", handler.get_recovery_stats, min_time_s,
+                         params={"recoveries": sum(handler.error_type_counts.values())}))
+
+    try:
+        from security_utils2 import generate_key, encrypt_file, encrypt_file_chunked
+    except ImportError:  # cryptography not installed
+        encrypt_file = None
+    if encrypt_file is not None:
+        key = generate_key()
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "results.jsonl")
+            with open(src, "w", encoding="utf-8") as f:
+                line = json.dumps({"id": "X", "last_output": _policy_text(rng, 40)}) + "\n"
+                f.write(line * ((1 << 20) // len(line)))
+            size = os.path.getsize(src)
+            dst = os.path.join(tmp, "results.enc")
+            out.append(time_call("encrypt_file", lambda: encrypt_file(key, src, dst), min_time_s,
+                                 params={"bytes": size}))
+            out.append(time_call("encrypt_file_chunked", lambda: encrypt_file_chunked(key, src, dst), min_time_s,
+                                 params={"bytes": size}))
+
+    n, n_groups = (10_000, 10) if quick else (100_000, 50)
+    groups = [f"g{rng.randrange(n_groups)}" for _ in range(n)]
+    selected = [rng.randint(0, 1) for _ in range(n)]
+    labels = [rng.randint(0, 1) for _ in range(n)]
+    params = {"rows": n, "groups": n_groups}
+    out.append(time_call("demographic_parity", lambda: fm.demographic_parity(selected, groups), min_time_s, params=params))
+    out.append(time_call("disparate_impact", lambda: fm.disparate_impact(selected, groups), min_time_s, params=params))
+    out.append(time_call("equal_opportunity", lambda: fm.equal_opportunity(labels, selected, groups), min_time_s,
+                         params=params))
+    return out
+
+
+def write_synthetic_tasks(path: Path, n: int, seed: int = 42):
+    """``n`` seeded synthetic tasks (generate_tasks.py) shaped like the template task file."""
+    sys.path.insert(0, str(ROOT))
+    from generate_tasks import TaskGenerator, TaskTemplates, write_tasks
+    write_tasks(TaskGenerator(TaskTemplates(str(TEMPLATE_TASKS)), seed=seed), path, 0, n)
+
+
+RSS_POLL_S = 0.005
+
+
+def _vm_hwm_kb(pid: int) -> Optional[int]:
+    """The process's own peak RSS (VmHWM) from /proc, or None where /proc is absent."""
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def run_process(name: str, cmd: List[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run ``cmd`` and report wall time and the child's own peak RSS.
+
+    The child's VmHWM is sampled every RSS_POLL_S until it exits: wait4's ru_maxrss would also
+    count the parent it was forked from, so it is only the fallback where /proc is absent. stderr
+    goes to a temporary file, so a chatty child never blocks on a full pipe.
+    """
+    with tempfile.TemporaryFile() as err:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=err)
+        peak: Optional[int] = None
+        while True:
+            hwm = _vm_hwm_kb(proc.pid)  # before reaping: an exited child has no memory to report
+            if hwm is not None:
+                peak = max(peak or 0, hwm)
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            time.sleep(RSS_POLL_S)
+        wall = time.perf_counter() - t0
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        err.seek(0)
+        stderr = err.read().decode("utf-8", "replace")
+    n = params.get("tasks", 0)
+    return {
+        "name": name,
+        "params": params,
+        "returncode": proc.returncode,
+        "wall_s": round(wall, 4),
+        "tasks_per_sec": round(n / wall, 2) if n and wall else None,
+        "peak_rss_kb": peak if peak is not None else _peak_rss_kb(usage),
+        **({"stderr": stderr[-2000:]} if proc.returncode else {}),
+    }
+
+
+def run_e2e(sizes: List[int], runs: int, concurrency: int, workdir: Path) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    py = sys.executable
+    for n in sizes:
+        tasks = workdir / f"tasks_{n}.jsonl"
+        results = workdir / f"results_{n}.jsonl"
+        write_synthetic_tasks(tasks, n)
+        params = {"tasks": n, "runs": runs, "concurrency": concurrency}
+        out.append(run_process("harness", [py, "Archive/run_harness.py", "--tasks", str(tasks), "--runs", str(runs),
+                                           "--concurrency", str(concurrency), "--out", str(results)], params))
+        for mode, extra in (("score_results", []), ("score_results_stream", ["--stream"])):
+            out.append(run_process(mode, [py, "score_results.py", "--tasks", str(tasks), "--results", str(results),
+                                          "--out", str(workdir / f"scores_{n}.json"), *extra], {"tasks": n}))
+    return out
+
+
+# Modules a `score` / `validate` invocation must not import; any of them costs far more than the budget
+HEAVY_MODULES = ("torch", "sentence_transformers", "cryptography", "matplotlib", "numpy")
+STARTUP_COMMANDS = {
+    "score": ["score", "--tasks", "tasks.jsonl", "--results", "results_demo.jsonl", "--out", "{tmp}/scores.json"],
+    "validate": ["validate", "--schema", "task_schema.yaml", "--workers", "1", "tasksUpdate.jsonl"],
+}
+
+
+def _imported_modules(cmd: List[str]) -> List[str]:
+    """Top-level packages ``cmd`` imports, from ``python -X importtime``."""
+    proc = subprocess.run([cmd[0], "-X", "importtime", *cmd[1:]], cwd=ROOT, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True)
+    names = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            names.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return sorted(names)
+
+
+def run_startup(repeats: int, budget_ms: float, workdir: Path) -> List[Dict[str, Any]]:
+    """Cold-start wall time of the CLI's light commands, over a bare interpreter, against ``budget_ms``.
+
+    The best of ``repeats`` runs is kept (startup noise only ever adds time); each result also lists
+    any HEAVY_MODULES the command imported, which fails it regardless of timing.
+    """
+    py = sys.executable
+    baseline = min(run_process("python", [py, "-c", "pass"], {})["wall_s"] for _ in range(repeats))
+    out: List[Dict[str, Any]] = []
+    for name, args in STARTUP_COMMANDS.items():
+        cmd = [py, "benchmark_cli.py", *(a.format(tmp=workdir) for a in args)]
+        runs = [run_process(f"startup_{name}", cmd, {"repeats": repeats}) for _ in range(repeats)]
+        best = min(runs, key=lambda r: r["wall_s"])
+        overhead_ms = round((best["wall_s"] - baseline) * 1000, 1)
+        heavy = [m for m in _imported_modules(cmd) if m in HEAVY_MODULES]
+        out.append({**best, "interpreter_s": baseline, "overhead_ms": overhead_ms, "budget_ms": budget_ms,
+                    "heavy_imports": heavy,
+                    "within_budget": best["returncode"] == 0 and overhead_ms <= budget_ms and not heavy})
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the benchmark harness, scorer and utilities")
+    ap.add_argument("suite", choices=["micro", "e2e", "startup", "all"], nargs="?", default="all")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--min_time", type=float, default=0.5, help="seconds per microbenchmark")
+    ap.add_argument("--quick", action="store_true", help="smaller fixtures (CI smoke run)")
+    ap.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated task counts for e2e")
+    ap.add_argument("--runs", type=int, default=1, help="harness runs per task for e2e")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--workdir", default=None, help="keep e2e inputs/outputs here instead of a temp dir")
+    ap.add_argument("--startup_repeats", type=int, default=5)
+    ap.add_argument("--startup_budget_ms", type=float, default=250.0,
+                    help="max cold-start time of `score` / `validate` over a bare interpreter; exits 1 if exceeded")
+    args = ap.parse_args()
+
+    report: Dict[str, Any] = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(), "timestamp": int(time.time())},
+    }
+    if args.suite in ("micro", "all"):
+        report["micro"] = run_micro(args.min_time, args.quick)
+    if args.suite in ("e2e", "all"):
+        sizes = [int(s) for s in args.sizes.split(",") if s]
+        if args.workdir:
+            Path(args.workdir).mkdir(parents=True, exist_ok=True)
+            report["e2e"] = run_e2e(sizes, args.runs, args.concurrency, Path(args.workdir))
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                report["e2e"] = run_e2e(sizes, args.runs, args.concurrency, Path(tmp))
+    if args.suite in ("startup", "all"):
+        with tempfile.TemporaryDirectory() as tmp:
+            report["startup"] = run_startup(args.startup_repeats, args.startup_budget_ms, Path(tmp))
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Wrote {args.out}")
+    over = [r for r in report.get("startup", []) if not r["within_budget"]]
+    for r in over:
+        print(f"{r['name']}: {r['overhead_ms']} ms over the interpreter (budget {r['budget_ms']} ms), "
+              f"returncode {r['returncode']}, heavy imports {r['heavy_imports'] or 'none'}", file=sys.stderr)
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# blob_store.py
+# Content-addressed sidecar for large repeated outputs and traces in result rows and audit logs; rows hold {"$blob": <hash>} references
+
+from __future__ import annotations
+import argparse, hashlib, json, os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+REF_KEY = "$blob"
+# The output/trace fields (at any depth) that may be externalized; ids, task sets and labels always stay inline
+BLOB_FIELDS = frozenset({"model_output", "reasoning_trace", "fallback_used", "last_output", "output"})
+# Sidecar record: b"<hash> <payload bytes>\n" + payload + b"\n", appended once per distinct value; the payload
+# is the value's JSON text (UTF-8), so structured outputs round-trip with their type
+
+
+def blob_path(results_path: str) -> str:
+    return f"{results_path}.blobs"
+
+
+def is_ref(v: Any) -> bool:
+    return type(v) is dict and len(v) == 1 and REF_KEY in v
+
+
+def add_blob_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--blob_store", action="store_true",
+                    help="store output/trace values of --blob_min_bytes or more once in <out>.blobs and reference them by hash")
+    ap.add_argument("--blob_min_bytes", type=int, default=256)
+
+
+def _scan(f) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """({hash: (payload offset, length)}, end of the last complete record); the first copy of a hash wins."""
+    index: Dict[str, Tuple[int, int]] = {}
+    pos = 0
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    while True:
+        header = f.readline()
+        if not header.endswith(b"\n"):
+            return index, pos
+        try:
+            h, n = header.split()
+            n = int(n)
+        except ValueError:
+            return index, pos
+        start = pos + len(header)
+        if start + n + 1 > size:  # torn by a crash mid-append
+            return index, pos
+        index.setdefault(h.decode("ascii"), (start, n))
+        pos = start + n + 1
+        f.seek(pos)
+
+
+class BlobWriter:
+    """Appends each distinct value of ``min_bytes`` or more once; ``externalize`` swaps them for references.
+
+    A fresh run truncates the sidecar like the results file; ``resume`` keeps the existing blobs
+    and drops a torn last record. Call ``sync`` before syncing rows that reference it, so no row
+    outlives its blobs.
+    """
+
+    def __init__(self, path: str, min_bytes: int = 256, resume: bool = False):
+        self.path = path
+        self.min_bytes = max(3, min_bytes)  # "", [] and {} are never blobs, so refs stay truthy
+        self._f = open(path, "a+b" if resume else "w+b")
+        index, end = _scan(self._f)
+        self._f.truncate(end)
+        self._f.seek(end)
+        self._seen = set(index)
+        self.values = 0         # values externalized
+        self.bytes_in = 0       # their JSON size
+        self.bytes_stored = 0   # what this writer appended
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace, out_path: str, resume: bool = False) -> Optional["BlobWriter"]:
+        """``resume``: the run continues from a checkpoint (results are appended, not rewritten)."""
+        return cls(blob_path(out_path), args.blob_min_bytes, resume) if args.blob_store else None
+
+    def put(self, value: Any, data: Optional[bytes] = None) -> Dict[str, str]:
+        data = data if data is not None else json.dumps(value, ensure_ascii=False).encode("utf-8")
+        h = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self.values += 1
+        self.bytes_in += len(data)
+        if h not in self._seen:
+            self._seen.add(h)
+            record = f"{h} {len(data)}\n".encode("ascii") + data + b"\n"
+            self._f.write(record)
+            self.bytes_stored += len(record)
+        return {REF_KEY: h}
+
+    def externalize(self, obj: Any) -> Any:
+        """A copy of ``obj`` with every BLOB_FIELDS value of ``min_bytes`` or more (as JSON) replaced by its reference."""
+        if type(obj) is dict:
+            return {k: self._field(v) if k in BLOB_FIELDS else self.externalize(v) for k, v in obj.items()}
+        if type(obj) is list:
+            return [self.externalize(v) for v in obj]
+        return obj
+
+    def _field(self, value: Any) -> Any:
+        if type(value) is str:
+            if len(value) * 4 + 2 < self.min_bytes:  # too short even at 4 UTF-8 bytes per code point
+                return value
+        elif type(value) not in (dict, list):
+            return value
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        return self.put(value, data) if len(data) >= self.min_bytes else value
+
+    def stats(self) -> Dict[str, Any]:
+        return {"values": self.values, "bytes_in": self.bytes_in, "bytes_stored": self.bytes_stored,
+                "dedup_ratio": round(self.bytes_in / self.bytes_stored, 2) if self.bytes_stored else None}
+
+    def sync(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BlobReader:
+    """Resolves references on demand: the index is built on first use and blobs are read by
+    offset, with a small LRU cache of their text since the same few values recur across rows."""
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._f = None
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, h: str) -> Any:
+        text = self._cache.get(h)
+        if text is not None:
+            self._cache.move_to_end(h)
+            return json.loads(text)  # a fresh object per row, as if the row had held it inline
+        if self._f is None:
+            self._f = open(self.path, "rb")
+            self._index = _scan(self._f)[0]
+        try:
+            start, n = self._index[h]
+        except KeyError:
+            raise KeyError(f"blob {h} is not in {self.path}") from None
+        self._f.seek(start)
+        text = self._f.read(n).decode("utf-8")
+        self._cache[h] = text
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return json.loads(text)
+
+    def resolve(self, v: Any) -> Any:
+        return self.get(v[REF_KEY]) if is_ref(v) else v
+
+    def inline(self, obj: Any) -> Any:
+        """``obj`` with every reference replaced by its value."""
+        if is_ref(obj):
+            return self.get(obj[REF_KEY])
+        if type(obj) is dict:
+            return {k: self.inline(v) for k, v in obj.items()}
+        if type(obj) is list:
+            return [self.inline(v) for v in obj]
+        return obj
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def merge_blobs(results_paths, out_path: str) -> int:
+    """Copy the blobs of every ``results_paths`` sidecar into ``out_path``'s, each hash once; returns blobs added."""
+    added = 0
+    with BlobWriter(blob_path(out_path)) as dst:
+        for path in results_paths:
+            if not os.path.isfile(blob_path(path)):
+                continue
+            with open(blob_path(path), "rb") as src:
+                for h, (start, n) in _scan(src)[0].items():
+                    if h not in dst._seen:
+                        src.seek(start)
+                        dst._seen.add(h)
+                        dst._f.write(f"{h} {n}\n".encode("ascii") + src.read(n) + b"\n")
+                        added += 1
+        dst.sync()
+    return added
+
+
+def open_blob_reader(results_path: str) -> Optional[BlobReader]:
+    """The reader for ``results_path``'s sidecar, or None if it was written without --blob_store."""
+    path = blob_path(results_path)
+    return BlobReader(path) if os.path.isfile(path) else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert results JSONL to and from blob-store form")
+    ap.add_argument("direction", choices=["externalize", "inline"])
+    ap.add_argument("src", help="results JSONL (its <src>.blobs sidecar is read for inline)")
+    ap.add_argument("dst", help="output JSONL (externalize also writes <dst>.blobs)")
+    ap.add_argument("--blob_min_bytes", type=int, default=256)
+    args = ap.parse_args()
+    with open(args.src, "r", encoding="utf-8") as fin, open(args.dst, "w", encoding="utf-8") as fout:
+        if args.direction == "externalize":
+            with BlobWriter(blob_path(args.dst), args.blob_min_bytes) as blobs:
+                for line in fin:
+                    if line.strip():
+                        fout.write(json.dumps(blobs.externalize(json.loads(line))) + "\n")
+                print(json.dumps(blobs.stats()))
+        else:
+            reader = open_blob_reader(args.src)
+            if reader is None:
+                ap.error(f"{blob_path(args.src)} not found")
+            for line in fin:
+                if line.strip():
+                    fout.write(json.dumps(reader.inline(json.loads(line))) + "\n")
+    print(f"Wrote {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
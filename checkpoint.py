@@ -0,0 +1,84 @@
+# checkpoint.py
+# Periodic run checkpoints for the harnesses: --resume continues a killed run where its last checkpoint left off
+
+from __future__ import annotations
+import argparse, itertools, json, os, random
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+# Interval used when --resume is given without --checkpoint_every, so a resumed run stays resumable
+DEFAULT_EVERY = 1000
+
+
+def add_checkpoint_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--checkpoint_every", type=int, default=None,
+                    help=f"write <out>.ckpt.json after every N tasks (off unless given; --resume implies {DEFAULT_EVERY})")
+    ap.add_argument("--resume", action="store_true",
+                    help="continue from <out>.ckpt.json: skip completed tasks and append to the existing results")
+
+
+def rng_state(rng: random.Random) -> List[Any]:
+    version, internal, gauss_next = rng.getstate()
+    return [version, list(internal), gauss_next]
+
+
+def set_rng_state(rng: random.Random, state: List[Any]):
+    rng.setstate((state[0], tuple(state[1]), state[2]))
+
+
+class RunCheckpoint:
+    """``<out>.ckpt.json``: how many input tasks are done, the results offset they end at, and
+    whatever run state the harness adds. Saved atomically after the results are synced, so on
+    resume the results are cut back to that offset and nothing is written or counted twice.
+    """
+
+    def __init__(self, out_path: str, every: int = 0):
+        self.path = Path(f"{out_path}.ckpt.json")
+        self.log_path = Path(f"{out_path}.ckpt.log")  # audit log entries up to the checkpoint
+        self.every = every
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace, out_path: str) -> "RunCheckpoint":
+        every = args.checkpoint_every
+        if every is None:
+            every = DEFAULT_EVERY if args.resume else 0
+        return cls(out_path, every)
+
+    def load(self, tasks_path: str, shard: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The saved state, or None to start from scratch (no checkpoint yet)."""
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            print(f"No checkpoint at {self.path}; starting from the first task")
+            return None
+        if state.get("tasks") != os.path.abspath(tasks_path):
+            raise ValueError(f"{self.path} was written for {state.get('tasks')}, not {tasks_path}")
+        if state.get("shard") != shard:
+            raise ValueError(f"{self.path} was written for shard {state.get('shard')}, not {shard}")
+        return state
+
+    def due(self, tasks_done: int) -> bool:
+        return self.every > 0 and tasks_done % self.every == 0
+
+    def save(self, tasks_path: str, tasks_done: int, results_offset: int, complete: bool = False, **state: Any):
+        state = {"tasks": os.path.abspath(tasks_path), "tasks_done": tasks_done,
+                 "results_offset": results_offset, "complete": complete, **state}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def skip_done(tasks: Iterable[Dict[str, Any]], state: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """``tasks`` without the ones a checkpoint covers; the last skipped task must be the one it recorded."""
+    it = iter(tasks)
+    if state and state["tasks_done"]:
+        last = None
+        for last in itertools.islice(it, state["tasks_done"]):
+            pass
+        if last is None or last.get("id") != state.get("last_id"):
+            raise ValueError(f"task {state['tasks_done']} is not {state.get('last_id')!r}; the task file changed since the checkpoint")
+    return it
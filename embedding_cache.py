@@ -0,0 +1,203 @@
+# embedding_cache.py
+# Constraint embedding cache for fairness audits: in-memory, optionally backed by tiered, memory-mapped .npy segments
+
+from __future__ import annotations
+import hashlib, json, os, uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl  # POSIX; elsewhere concurrent writers to one cache_dir are not serialized
+except ImportError:
+    fcntl = None  # type: ignore
+
+try:
+    import numpy as np  # Present whenever sentence-transformers is installed
+except Exception:
+    np = None  # type: ignore
+
+
+def constraint_key(task_id: str, text: str) -> str:
+    return hashlib.sha256(f"{task_id}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+# Segments are tiered by row count (tier t holds < FANOUT**(t+1) rows); FANOUT segments of one tier merge into one,
+# so a vector is copied O(log n) times and a cache holds O(FANOUT * log n) segments however many flushes wrote it
+FANOUT = 32
+OPEN_SEGMENTS = 16  # memory maps kept open at once (each holds a file descriptor)
+
+
+def _tier(rows: int) -> int:
+    tier = 0
+    while rows >= FANOUT ** (tier + 1):
+        tier += 1
+    return tier
+
+
+class ConstraintEmbeddingCache:
+    """Embeddings keyed by (task id, constraint text).
+
+    With ``cache_dir`` set, vectors persist in append-only ``<model>.seg-*.npy`` segments plus a
+    ``<model>.index.jsonl`` log of [key, segment, row] lines (the last line for a key wins), so
+    later processes and runs skip the encoder. A flush writes its segment, then appends its keys to
+    the log under ``<model>.lock``; processes sharing the directory (--shard runs,
+    embedding_service.py) only ever see log lines whose segments exist, and read just the lines
+    added since they last looked. Under the same lock, FANOUT segments of one size tier are merged
+    into one and the moved keys appended; merged segments are deleted, so a reader that meets a
+    missing segment catches up on the log and retries. Rows are copied out of an LRU of at most
+    OPEN_SEGMENTS memory maps.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, model_name: str = "all-MiniLM-L6-v2"):
+        self.memory: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dir = Path(cache_dir) if cache_dir else None
+        self._index: Dict[str, Tuple[str, int]] = {}
+        self._segments: "OrderedDict[str, Any]" = OrderedDict()
+        self._log_pos = 0
+        if self._dir is not None:
+            self._stem = model_name.replace("/", "_")
+            self._log = self._dir / f"{self._stem}.index.jsonl"
+            self._legacy = self._dir / f"{self._stem}.index.json"
+            self._lock = self._dir / f"{self._stem}.lock"
+            if np is not None:
+                self._refresh()
+
+    def _read_legacy(self) -> Dict[str, Tuple[str, int]]:
+        """The whole-file index written before the log; an int row is the single <model>.npy store."""
+        try:
+            raw = json.loads(self._legacy.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return {k: (f"{self._stem}.npy", v) if isinstance(v, int) else tuple(v) for k, v in raw.items()}
+
+    def _refresh(self):
+        """Apply the log lines appended since the last call."""
+        try:
+            f = open(self._log, "rb")
+        except FileNotFoundError:
+            self._index = self._read_legacy()
+            return
+        with f:
+            f.seek(self._log_pos)
+            for line in f:
+                if not line.endswith(b"\n"):  # torn by a crash mid-append; the next writer overwrites it
+                    break
+                key, segment, row = json.loads(line)
+                self._index[key] = (segment, row)
+                self._log_pos += len(line)
+
+    def _store(self, segment: str):
+        store = self._segments.get(segment)
+        if store is None:
+            store = self._segments[segment] = np.load(self._dir / segment, mmap_mode="r")
+            if len(self._segments) > OPEN_SEGMENTS:
+                self._segments.popitem(last=False)
+        else:
+            self._segments.move_to_end(segment)
+        return store
+
+    def _vector(self, key: str):
+        segment, row = self._index[key]
+        try:
+            store = self._store(segment)
+        except FileNotFoundError:  # merged away by another process
+            self._refresh()
+            segment, row = self._index[key]
+            store = self._store(segment)
+        return np.array(store[row])  # a copy, so evicted maps are released
+
+    def _write_segment(self, rows) -> str:
+        segment = f"{self._stem}.seg-{uuid.uuid4().hex}.npy"
+        tmp = self._dir / f"{segment}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.stack([np.asarray(v, dtype=np.float32) for v in rows]))
+        os.replace(tmp, self._dir / segment)
+        return segment
+
+    def _append(self, entries: List[Tuple[str, str, int]]):
+        """Append log lines (under the lock, after the log has been refreshed)."""
+        with open(self._log, "ab") as f:
+            f.truncate(self._log_pos)  # drop a torn tail
+            f.write("".join(json.dumps(e) + "\n" for e in entries).encode("utf-8"))
+        self._refresh()
+
+    def _compact(self):
+        """Merge every tier holding FANOUT or more segments (under the lock)."""
+        while True:
+            keys: Dict[str, List[str]] = {}
+            for key, (segment, _) in self._index.items():
+                keys.setdefault(segment, []).append(key)
+            tiers: Dict[int, List[str]] = {}
+            for segment, seg_keys in keys.items():
+                tiers.setdefault(_tier(len(seg_keys)), []).append(segment)
+            full = next((segs for segs in tiers.values() if len(segs) >= FANOUT), None)
+            if full is None:
+                return
+            moved = [key for segment in full for key in keys[segment]]
+            merged = self._write_segment([self._vector(key) for key in moved])
+            self._append([(key, merged, i) for i, key in enumerate(moved)])
+            for segment in full:
+                self._segments.pop(segment, None)
+                (self._dir / segment).unlink(missing_ok=True)
+
+    def _persist(self, new: Dict[str, Any]):
+        if self._dir is None or np is None or not new:
+            return
+        self._dir.mkdir(parents=True, exist_ok=True)
+        segment = self._write_segment(new.values())
+        with open(self._lock, "a+b") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Catch up under the lock: other processes may have appended since we last looked
+            self._refresh()
+            entries = [(key, segment, i) for i, key in enumerate(new) if key not in self._index]
+            legacy = not self._log.exists() and bool(self._index)
+            if legacy:  # carry the pre-log index over
+                entries = [(k, s, r) for k, (s, r) in self._index.items()] + entries
+            if entries:
+                self._append(entries)
+                if legacy:
+                    self._legacy.unlink(missing_ok=True)
+                self._compact()
+            else:
+                (self._dir / segment).unlink(missing_ok=True)
+
+    def missing(self, task_id: str, constraints: List[str]) -> List[str]:
+        """The constraint texts ``get_many`` would have to encode (so callers can batch them)."""
+        out = []
+        for text in constraints:
+            key = constraint_key(task_id, text)
+            if key not in self.memory and key not in self._index:
+                out.append(text)
+        return out
+
+    def add(self, vectors: Dict[Tuple[str, str], Any]):
+        """Store already-encoded {(task id, constraint): vector} entries (counted as misses), persisting them in one flush."""
+        fresh = {constraint_key(task_id, text): v for (task_id, text), v in vectors.items()}
+        self.misses += len(fresh)
+        self.memory.update(fresh)
+        self._persist(fresh)
+
+    def get_many(self, task_id: str, constraints: List[str], encode: Callable[[List[str]], Any]):
+        """Embeddings for ``constraints`` in order; ``encode`` is only called for cache misses."""
+        keys = [constraint_key(task_id, c) for c in constraints]
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, constraints):
+            if key in self.memory:
+                continue
+            if key in self._index:
+                self.memory[key] = self._vector(key)
+            else:
+                missing.setdefault(key, text)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = encode(list(missing.values()))
+            fresh = dict(zip(missing, vectors))
+            self.memory.update(fresh)
+            self._persist(fresh)
+        vecs = [self.memory[k] for k in keys]
+        return np.stack(vecs) if np is not None else vecs
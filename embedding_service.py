@@ -0,0 +1,247 @@
+# embedding_service.py
+# Shared fairness-audit encoder: one process loads the model and serves output/constraint similarities over a Unix socket
+
+from __future__ import annotations
+import argparse, json, os, queue, signal, socket, socketserver, sys, threading, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from embedding_cache import ConstraintEmbeddingCache
+
+# Wire format: one JSON object per line each way.
+#   {"task_id": ..., "output": ..., "constraints": [...]}  ->  {"sims": [cosine per constraint]}
+#   {"op": "ping"} / {"op": "stats"}                        ->  {"ok": true} / counters
+# Failures come back as {"error": "..."}.
+
+
+class _Pending:
+    __slots__ = ("request", "reply", "done")
+
+    def __init__(self, request: Dict[str, Any]):
+        self.request = request
+        self.reply: Dict[str, Any] = {}
+        self.done = threading.Event()
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    server: "EmbeddingServer"
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get("op", "sims")
+            except (ValueError, AttributeError):
+                reply = {"error": "invalid JSON request"}
+            else:
+                if op == "ping":
+                    reply = {"ok": True, "model": self.server.model_name}
+                elif op == "stats":
+                    reply = self.server.stats()
+                else:
+                    reply = self.server.submit(request)
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """Loads the encoder once and answers similarity requests from any number of handlers.
+
+    Each connection gets a thread; requests from all of them queue up for a single batching
+    thread, which waits up to ``max_wait_ms`` for ``max_batch`` requests and encodes every
+    output plus every not-yet-cached constraint in one ``encode`` call. Constraint vectors are
+    kept in a shared ``ConstraintEmbeddingCache`` (persisted when ``cache_dir`` is set).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, model_name: str = "all-MiniLM-L6-v2", max_batch: int = 64,
+                 max_wait_ms: float = 2.0, cache_dir: Optional[str] = None,
+                 encoder: Optional[Callable[[List[str]], Any]] = None):
+        _clear_stale_socket(socket_path)
+        self.model_name = model_name
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_ms / 1000
+        self.cache = ConstraintEmbeddingCache(cache_dir, model_name)
+        self._encode = encoder or _load_encoder(model_name, self.max_batch)
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts_encoded = 0
+        super().__init__(socket_path, _Connection)
+        self._batcher = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+        self._batcher.start()
+
+    def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        pending = _Pending(request)
+        self._queue.put(pending)
+        pending.done.wait()
+        return pending.reply
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"model": self.model_name, "requests": self.requests, "batches": self.batches,
+                    "texts_encoded": self.texts_encoded,
+                    "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                    "constraint_cache_hits": self.cache.hits, "constraint_cache_misses": self.cache.misses}
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:  # the encoder failed; every waiter gets the error
+                for pending in batch:
+                    if not pending.reply:
+                        pending.reply = {"error": f"{type(e).__name__}: {e}"}
+            for pending in batch:
+                pending.done.set()
+
+    def _run_batch(self, batch: List[_Pending]):
+        import numpy as np
+        jobs: List[Tuple[_Pending, str, str, List[str]]] = []
+        for pending in batch:
+            r = pending.request
+            constraints = r.get("constraints")
+            if not isinstance(constraints, list) or not all(isinstance(c, str) for c in constraints):
+                pending.reply = {"error": "constraints must be a list of strings"}
+                continue
+            jobs.append((pending, str(r.get("task_id", "")), str(r.get("output", "")), constraints))
+        if not jobs:
+            return
+        cold: Dict[Tuple[str, str], None] = {}
+        for _, task_id, _, constraints in jobs:
+            cold.update(dict.fromkeys((task_id, c) for c in self.cache.missing(task_id, constraints)))
+        texts = [output for _, _, output, _ in jobs] + [c for _, c in cold]
+        vectors = np.asarray(self._encode(texts), dtype=np.float32)
+        # One store flush for the whole batch; every job then reads its constraints from memory
+        self.cache.add(dict(zip(cold, vectors[len(jobs):])))
+        for (pending, task_id, _, constraints), out_vec in zip(jobs, vectors):
+            if not constraints:
+                pending.reply = {"sims": []}
+                continue
+            con = np.asarray(self.cache.get_many(task_id, constraints, _already_cached), dtype=np.float32)
+            pending.reply = {"sims": _cos_sim(out_vec, con).tolist()}
+        self.cache.hits -= len(cold)  # their first lookups above; add() already counted them as misses
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts_encoded += len(texts)
+
+
+def _already_cached(texts: List[str]):
+    raise RuntimeError(f"constraints missing from the cache after the batch flush: {texts}")
+
+
+def _cos_sim(vec, mat):
+    # Same as sentence_transformers.util.cos_sim for one query row (rows normalized with eps 1e-12)
+    import numpy as np
+    vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+    mat = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+    return mat @ vec
+
+
+def _load_encoder(model_name: str, batch_size: int) -> Callable[[List[str]], Any]:
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
+    return lambda texts: model.encode(texts, convert_to_numpy=True, batch_size=batch_size)
+
+
+def _clear_stale_socket(path: str):
+    """Remove a socket file left by a dead server; refuse to start over a live one."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(f"an embedding service is already listening on {path}")
+    finally:
+        probe.close()
+
+
+class EmbeddingServiceClient:
+    """Client side of the service for ``ErrorRecoveryHandler``; one persistent connection, thread-safe.
+
+    Any socket or server failure raises (``OSError`` or ``RuntimeError``) so the caller can fall
+    back to in-process encoding.
+    """
+
+    def __init__(self, socket_path: str, timeout_s: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+        self._lock = threading.Lock()
+
+    def _request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._sock.settimeout(self.timeout_s)
+                    self._sock.connect(self.socket_path)
+                    self._rfile = self._sock.makefile("rb")
+                self._sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+                line = self._rfile.readline()
+                if not line:
+                    raise ConnectionError(f"embedding service at {self.socket_path} closed the connection")
+            except OSError:
+                self.close()
+                raise
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"embedding service: {reply['error']}")
+        return reply
+
+    def similarities(self, task_id: str, output: str, constraints: List[str]) -> List[float]:
+        """Cosine similarity of ``output`` to each constraint, as util.cos_sim would give it."""
+        return self._request({"task_id": task_id, "output": output, "constraints": list(constraints)})["sims"]
+
+    def ping(self) -> bool:
+        try:
+            return bool(self._request({"op": "ping"}).get("ok"))
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request({"op": "stats"})
+
+    def close(self):
+        if self._rfile is not None:
+            self._rfile.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock, self._rfile = None, None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve fairness-audit embeddings to harness processes over a Unix socket")
+    ap.add_argument("--socket", default="embedding.sock", help="Unix socket path (pass the same path as --embedding_socket)")
+    ap.add_argument("--model", default="all-MiniLM-L6-v2")
+    ap.add_argument("--max_batch", type=int, default=64, help="most requests encoded together")
+    ap.add_argument("--max_wait_ms", type=float, default=2.0, help="how long a batch waits to fill")
+    ap.add_argument("--embedding_cache", default=None, help="directory for persisted constraint embeddings")
+    args = ap.parse_args()
+
+    server = EmbeddingServer(args.socket, args.model, args.max_batch, args.max_wait_ms, args.embedding_cache)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Embedding service ({args.model}) listening on {args.socket}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        print(json.dumps(server.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,18 +12,27 @@ try:
     from sentence_transformers import SentenceTransformer, util
 except ImportError:
     SentenceTransformer, util = None, None
+from embedding_cache import ConstraintEmbeddingCache
 
 class ErrorRecoveryHandler:
-    def __init__(self, encryption_key: Optional[bytes] = None, fairness_check: bool = False, api_key: Optional[str] = None):
+    def __init__(self, encryption_key: Optional[bytes] = None, fairness_check: bool = False, api_key: Optional[str] = None,
+                 embedding_cache_dir: Optional[str] = None):
         self.categories = ["retry", "fallback", "escalate", "safe-fail"]
         self.encryption_key = encryption_key
         self.cipher = Fernet(encryption_key) if Fernet and encryption_key else None
         self.recovery_log = []
         self.fairness_check = fairness_check
-        self.fairness_model = SentenceTransformer('all-MiniLM-L6-v2') if SentenceTransformer else None
+        self._fairness_model = None  # loaded on first escalation, only when fairness_check is set
+        self.embedding_cache = ConstraintEmbeddingCache(embedding_cache_dir)
         self.api_key = api_key
         random.seed(42)  # Reproducibility
 
+    @property
+    def fairness_model(self):
+        if self._fairness_model is None and self.fairness_check and SentenceTransformer:
+            self._fairness_model = SentenceTransformer('all-MiniLM-L6-v2')
+        return self._fairness_model
+
     def classify_and_recover(self, task: Dict[str, Any], error_type: str, trace: Dict[str, Any]) -> Dict[str, Any]:
         start_time = time.time()
         pattern = "none"
@@ -71,8 +80,13 @@ class ErrorRecoveryHandler:
         if pattern == "escalate" and self.fairness_check and self.fairness_model:
             output = trace.get("model_output", "")
             constraints = task.get("constraints", [])
-            embeddings = self.fairness_model.encode([output] + constraints)
-            similarities = util.cos_sim(embeddings[0], embeddings[1:])
+            similarities = []
+            if constraints:
+                # Only the output is encoded per call; constraint vectors come from the cache
+                out_emb = self.fairness_model.encode([output], convert_to_numpy=True)
+                con_emb = self.embedding_cache.get_many(
+                    task.get("id", ""), constraints, lambda texts: self.fairness_model.encode(texts, convert_to_numpy=True))
+                similarities = util.cos_sim(out_emb, con_emb).cpu().numpy().tolist()[0]
             if any(sim > 0.7 for sim in similarities):
                 trace["fairness_audit"] = "Potential proxy violation detected"
             else:
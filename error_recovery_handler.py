@@ -2,18 +2,33 @@
 # error_recovery_handler.py
 # Production-ready error recovery orchestration with optional encryption, fairness auditing, and pluggable model client.
 from __future__ import annotations
-import json, time, random
+import itertools, json, sys, time, random
+from functools import lru_cache
 from typing import Dict, Any, Optional, Protocol, List
+from embedding_cache import ConstraintEmbeddingCache
+from embedding_service import EmbeddingServiceClient
+from retry_scheduler import RetryScheduler
+from trace_spans import span, ns_to_ms, retry_span_name, FALLBACK, FAIRNESS_AUDIT, SECURE_LOGGING
 
-try:
-    from cryptography.fernet import Fernet  # Optional: for secure logging
-except Exception:
-    Fernet = None  # type: ignore
 
-try:
-    from sentence_transformers import SentenceTransformer, util  # Optional: fairness proxy detection
-except Exception:
-    SentenceTransformer, util = None, None  # type: ignore
+# Optional dependencies are imported on first use: sentence-transformers pulls in torch, and
+# runs without an encryption key or fairness audits shouldn't pay for either at startup
+@lru_cache(maxsize=None)
+def _fernet():
+    try:
+        from cryptography.fernet import Fernet  # Optional: for secure logging
+    except Exception:
+        return None
+    return Fernet
+
+
+@lru_cache(maxsize=None)
+def _sentence_transformers():
+    try:
+        from sentence_transformers import SentenceTransformer, util  # Optional: fairness proxy detection
+    except Exception:
+        return None, None
+    return SentenceTransformer, util
 
 
 class ModelClient(Protocol):
@@ -47,6 +62,11 @@ class ErrorRecoveryHandler:
         recovery_weights: Optional[Dict[str, float]] = None,
         proxy_threshold: float = 0.70,
         rng_seed: Optional[int] = None,
+        embedding_cache_dir: Optional[str] = None,
+        fairness_model_name: str = "all-MiniLM-L6-v2",
+        retry_config: Optional[Dict[str, Any]] = None,
+        embedding_socket: Optional[str] = None,
+        blob_store: Optional[Any] = None,
     ):
         self.categories: List[str] = ["retry", "fallback", "escalate", "safe-fail"]
         self.model_client = model_client or DummyModelClient()
@@ -60,18 +80,62 @@ class ErrorRecoveryHandler:
         }
         self.proxy_threshold = proxy_threshold
         self.encryption_key = encryption_key
-        self.cipher = Fernet(encryption_key) if Fernet and encryption_key else None
-        self.recovery_log: List[bytes | str] = []
+        self.cipher = _fernet()(encryption_key) if encryption_key and _fernet() else None
+        self.recovery_log: List[bytes | str] = []  # audit artifact only; stats use the counters below
+        self.pattern_counts: Dict[str, int] = {c: 0 for c in self.categories}
+        self.error_type_counts: Dict[str, int] = {}
+        self.success_count = 0
+        self.recovery_latency_ns_total = 0
         self.fairness_check = fairness_check
-        self.fairness_model = SentenceTransformer('all-MiniLM-L6-v2') if (fairness_check and SentenceTransformer) else None
+        # The encoder is only loaded on the first escalation that needs a fairness audit
+        self.fairness_model_name = fairness_model_name
+        self._fairness_model = None
+        self.embedding_cache = ConstraintEmbeddingCache(embedding_cache_dir, fairness_model_name)
+        # A shared embedding_service.py process, when given, stands in for the local encoder
+        self.embedding_service = EmbeddingServiceClient(embedding_socket) if embedding_socket else None
+        # blob_store.BlobWriter shared with the results writer: long trace strings are logged as references
+        self.blob_store = blob_store
         self._rng = random.Random(rng_seed)
+        # Separate RNG for backoff jitter so recovery choices stay reproducible under rng_seed
+        self.retry_scheduler = RetryScheduler(retry_config, rng_seed)
+
+    @classmethod
+    def from_config(cls, path: str, **overrides: Any) -> "ErrorRecoveryHandler":
+        """Build a handler from config_recovery.yaml; keyword arguments take precedence."""
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        kwargs: Dict[str, Any] = {k: cfg[k] for k in ("retry_limit", "proxy_threshold", "rng_seed", "recovery_weights") if k in cfg}
+        if "retry" in cfg:
+            kwargs["retry_config"] = cfg["retry"]
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
+    @property
+    def fairness_model(self):
+        if self._fairness_model is None and self.fairness_check:
+            SentenceTransformer, _ = _sentence_transformers()
+            if SentenceTransformer:
+                self._fairness_model = SentenceTransformer(self.fairness_model_name)
+        return self._fairness_model
+
+    def call_model(self, task: Dict[str, Any]) -> str:
+        """First attempt through the scheduler, so pacing and the circuit breaker see every call."""
+        return self.retry_scheduler.call(self.model_client, task)
 
     def classify_and_recover(self, task: Dict[str, Any], error_type: str, trace: Dict[str, Any]) -> Dict[str, Any]:
-        start = time.time()
+        start = time.perf_counter_ns()
         pattern = "none"
         prob = self._rng.random()
         threshold = self.recovery_weights.get(error_type, 0.5)
-        if prob < threshold:
+        breaker = self.retry_scheduler.breaker(self.model_client)
+        if prob < threshold and breaker.blocked():
+            # Circuit open (or its half-open probe in flight): don't hit the client again, route
+            # straight to the configured action
+            trace["circuit_open"] = True
+            pattern = breaker.open_action
+            outcome = self._fallback(task, trace) if pattern == "fallback" else self._escalate_or_fail(task, trace, pattern)
+        elif prob < threshold:
             pattern = "retry"
             outcome = self._retry(task, trace)
         elif prob < 0.85:
@@ -81,62 +145,162 @@ class ErrorRecoveryHandler:
             pattern = "escalate" if "CPG" in task.get("task_set","") and "Violation" in error_type else "safe-fail"
             outcome = self._escalate_or_fail(task, trace, pattern)
 
-        trace.setdefault("performance_efficiency", {})
+        perf = trace.setdefault("performance_efficiency", {})
         trace["error_recovery_pattern"] = pattern
         trace["recovery_outcome"] = outcome
-        trace["performance_efficiency"]["latency_ms"] = trace["performance_efficiency"].get("latency_ms", 0) + int((time.time() - start) * 1000)
-        self._log_securely(trace)
+        recovery_ns = time.perf_counter_ns() - start
+        perf["latency_ms"] = perf.get("latency_ms", 0) + ns_to_ms(recovery_ns)
+        self._count_recovery(error_type, pattern, outcome, recovery_ns)
+        # Logged payload carries every span but its own
+        with span(perf, SECURE_LOGGING):
+            self._log_securely(trace)
         return trace
 
+    def _count_recovery(self, error_type: str, pattern: str, outcome: Any, recovery_ns: int):
+        if pattern in self.pattern_counts:
+            self.pattern_counts[pattern] += 1
+        self.error_type_counts[error_type] = self.error_type_counts.get(error_type, 0) + 1
+        if isinstance(outcome, str) and (outcome.startswith("Retry") and "successful" in outcome or outcome.startswith("Fallback")):
+            self.success_count += 1
+        self.recovery_latency_ns_total += recovery_ns
+
     def _retry(self, task: Dict[str, Any], trace: Dict[str, Any]) -> str:
         attempt = trace.get("retry_attempt", 0) + 1
         trace["retry_attempt"] = attempt
         if attempt > self.retry_limit:
             return f"Retry {attempt} failed for {task.get('id')} (limit reached)"
         try:
-            output = self.model_client.call(task)
+            with span(trace.setdefault("performance_efficiency", {}), retry_span_name(attempt)):
+                output = self.retry_scheduler.call(self.model_client, task, attempt=attempt)
             trace["model_output"] = output
             return f"Retry {attempt} successful for {task.get('id')}"
         except Exception as e:
             return f"Retry {attempt} failed for {task.get('id')}: {type(e).__name__}"
 
     def _fallback(self, task: Dict[str, Any], trace: Dict[str, Any]) -> str:
-        default = task.get("ground_truth", "No ground truth available")
-        trace["fallback_used"] = default
-        trace.setdefault("model_output", default)
+        with span(trace.setdefault("performance_efficiency", {}), FALLBACK):
+            default = task.get("ground_truth", "No ground truth available")
+            trace["fallback_used"] = default
+            trace.setdefault("model_output", default)
         return f"Fallback to ground truth for {task.get('id')}"
 
     def _escalate_or_fail(self, task: Dict[str, Any], trace: Dict[str, Any], pattern: str) -> str:
-        if pattern == "escalate" and self.fairness_check and self.fairness_model:
+        constraints = task.get("constraints", [])
+        if (pattern == "escalate" and self.fairness_check and constraints
+                and (self.embedding_service is not None or self.fairness_model)):
             output = str(trace.get("model_output", ""))
-            constraints = task.get("constraints", [])
-            if constraints:
-                emb = self.fairness_model.encode([output] + constraints, convert_to_tensor=True)
-                sims = util.cos_sim(emb[0], emb[1:]).cpu().numpy().tolist()[0]
-                if any(s > self.proxy_threshold for s in sims):
-                    trace["fairness_audit"] = "Potential proxy violation detected"
-                else:
-                    trace["fairness_audit"] = "No proxy violations"
+            with span(trace.setdefault("performance_efficiency", {}), FAIRNESS_AUDIT):
+                sims = self._constraint_similarities(str(task.get("id", "")), output, constraints)
+            if sims is None:
+                pass  # the service went away and there is no local encoder to fall back to
+            elif any(s > self.proxy_threshold for s in sims):
+                trace["fairness_audit"] = "Potential proxy violation detected"
+            else:
+                trace["fairness_audit"] = "No proxy violations"
         trace["escalation_flag"] = (pattern == "escalate")
         return f"{pattern.capitalize()} for {task.get('id')}"
 
+    def _constraint_similarities(self, task_id: str, output: str, constraints: List[str]) -> Optional[List[float]]:
+        if self.embedding_service is not None:
+            try:
+                return self.embedding_service.similarities(task_id, output, constraints)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Embedding service unavailable ({e}); encoding in-process from now on", file=sys.stderr)
+                self.embedding_service.close()
+                self.embedding_service = None
+        if not self.fairness_model:
+            return None
+        # Only the output is encoded per call; constraint vectors come from the cache
+        out_emb = self.fairness_model.encode([output], convert_to_numpy=True)
+        con_emb = self.embedding_cache.get_many(
+            task_id, constraints, lambda texts: self.fairness_model.encode(texts, convert_to_numpy=True))
+        return _sentence_transformers()[1].cos_sim(out_emb, con_emb).cpu().numpy().tolist()[0]
+
     def _log_securely(self, trace: Dict[str, Any]):
+        # An encrypted log keeps its strings inline; the blob sidecar is plaintext
+        if self.blob_store is not None and not self.cipher:
+            trace = self.blob_store.externalize(trace)
         payload = json.dumps(trace, ensure_ascii=False)
         if self.cipher:
             self.recovery_log.append(self.cipher.encrypt(payload.encode("utf-8")))
         else:
             self.recovery_log.append(payload)
 
-    def get_recovery_stats(self) -> Dict[str, float]:
-        if not self.recovery_log:
-            return {"total_recoveries": 0, "success_rate": 0.0, **{c: 0.0 for c in self.categories}}
-        pats, success = [], 0
-        for entry in self.recovery_log:
-            obj = json.loads(entry.decode("utf-8") if isinstance(entry, (bytes, bytearray)) else entry)
-            pats.append(obj.get("error_recovery_pattern", "none"))
-            out = obj.get("recovery_outcome", "")
-            if isinstance(out, str) and (out.startswith("Retry") and "successful" in out or out.startswith("Fallback")):
-                success += 1
-        total = len(pats)
-        dist = {c: round(pats.count(c)/total, 4) for c in self.categories}
-        return {"total_recoveries": total, "success_rate": round(success/total, 4), **dist}
+    def write_recovery_log(self, path: str, start: int = 0):
+        """Write the (optionally encrypted) audit log, one entry per line; it is never re-read for stats.
+        ``start`` > 0 appends the entries from that index on (the checkpoint sidecar)."""
+        with open(path, "a" if start else "w", encoding="utf-8") as f:
+            for entry in self.recovery_log[start:]:
+                f.write((entry.decode("ascii") if isinstance(entry, (bytes, bytearray)) else entry) + "\n")
+
+    def checkpoint_state(self) -> Dict[str, Any]:
+        """Everything get_recovery_stats() and later recovery choices depend on, except the audit
+        log itself (len only; the entries go to a sidecar via write_recovery_log)."""
+        from checkpoint import rng_state
+        return {
+            "rng": rng_state(self._rng),
+            "pattern_counts": self.pattern_counts,
+            "error_type_counts": self.error_type_counts,
+            "success_count": self.success_count,
+            "recovery_latency_ns_total": self.recovery_latency_ns_total,
+            "recovery_log_entries": len(self.recovery_log),
+            "client_key": RetryScheduler.client_key(self.model_client),
+            "retry_scheduler": self.retry_scheduler.checkpoint_state(),
+        }
+
+    def restore_state(self, state: Dict[str, Any], recovery_log_path: Optional[str] = None):
+        from checkpoint import set_rng_state
+        set_rng_state(self._rng, state["rng"])
+        self.pattern_counts = dict(state["pattern_counts"])
+        self.error_type_counts = dict(state["error_type_counts"])
+        self.success_count = state["success_count"]
+        self.recovery_latency_ns_total = state["recovery_latency_ns_total"]
+        self.recovery_log = []
+        if recovery_log_path and state["recovery_log_entries"]:
+            with open(recovery_log_path, "r", encoding="utf-8") as f:
+                for line in itertools.islice(f, state["recovery_log_entries"]):
+                    entry = line.rstrip("\n")
+                    self.recovery_log.append(entry.encode("ascii") if self.cipher else entry)
+        self.retry_scheduler.restore_state(state["retry_scheduler"],
+                                           {state["client_key"]: RetryScheduler.client_key(self.model_client)})
+
+    def get_recovery_stats(self) -> Dict[str, Any]:
+        # O(1): served from the running counters kept by classify_and_recover
+        return recovery_stats({
+            "patterns": dict(self.pattern_counts),
+            "error_types": dict(self.error_type_counts),
+            "successes": self.success_count,
+            "recovery_latency_ns": self.recovery_latency_ns_total,
+        }, self.retry_scheduler.stats())
+
+
+def recovery_stats(counts: Dict[str, Any], scheduler: Dict[str, Any]) -> Dict[str, Any]:
+    """get_recovery_stats() for raw ``counts``. The counts are part of the output, so stats from
+    separate processes (shards) merge exactly with merge_recovery_stats()."""
+    total = sum(counts["error_types"].values())
+    if not total:
+        return {"total_recoveries": 0, "success_rate": 0.0, **{c: 0.0 for c in counts["patterns"]},
+                "retry_scheduler": scheduler, "counts": counts}
+    dist = {c: round(n/total, 4) for c, n in counts["patterns"].items()}
+    return {
+        "total_recoveries": total,
+        "success_rate": round(counts["successes"]/total, 4),
+        **dist,
+        "by_error_type": dict(counts["error_types"]),
+        "avg_recovery_latency_ms": round(counts["recovery_latency_ns"]/total/1e6, 4),
+        "retry_scheduler": scheduler,
+        "counts": counts,
+    }
+
+
+def merge_recovery_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Global recovery stats from per-process ``get_recovery_stats()`` outputs, as if one handler had seen every task."""
+    counts: Dict[str, Any] = {"patterns": {}, "error_types": {}, "successes": 0, "recovery_latency_ns": 0}
+    for s in stats:
+        c = s["counts"]
+        for key in ("patterns", "error_types"):
+            for name, n in c[key].items():
+                counts[key][name] = counts[key].get(name, 0) + n
+        counts["successes"] += c["successes"]
+        counts["recovery_latency_ns"] += c["recovery_latency_ns"]
+    return recovery_stats(counts, RetryScheduler.merge_stats([s["retry_scheduler"] for s in stats]))
@@ -1,6 +1,7 @@
-import json, re
+import json, re, random
 from typing import List, Dict, Any
 from difflib import SequenceMatcher
+from functools import lru_cache
 
 def jaccard(a: str, b: str) -> float:
     sa, sb = set(a.split()), set(b.split())
@@ -11,25 +12,224 @@ def jaccard(a: str, b: str) -> float:
 def levenshtein_ratio(a: str, b: str) -> float:
     return SequenceMatcher(None, a, b).ratio()
 
-def determinism_index(outputs: List[str]) -> float:
+def _collapse(outputs: List[str]):
+    # Unique outputs in first-seen order, plus each output's index into that list
+    index: Dict[str, int] = {}
+    codes = [index.setdefault(o, len(index)) for o in outputs]
+    return list(index), codes
+
+def _token_bitsets(uniques: List[str]) -> List[int]:
+    # Each output is tokenized once into a row of a token-id incidence matrix, packed into
+    # an int so intersections/unions are word-wide AND/OR + popcount instead of set ops.
+    vocab: Dict[str, int] = {}
+    ids = [[vocab.setdefault(tok, len(vocab)) for tok in u.split()] for u in uniques]
+    rows = []
+    for row_ids in ids:
+        bits = bytearray((len(vocab) + 7) // 8)
+        for i in row_ids:
+            bits[i >> 3] |= 1 << (i & 7)
+        rows.append(int.from_bytes(bits, "little"))
+    return rows
+
+def _bitset_jaccard(a: int, b: int) -> float:
+    if not a and not b:
+        return 1.0
+    return (a & b).bit_count() / max(1, (a | b).bit_count())
+
+def _pair_similarity_matrix(uniques: List[str], codes: List[int]) -> List[List[float]]:
+    n_u = len(uniques)
+    rows = _token_bitsets(uniques)
+    # Only ordered (earlier, later) pairs that actually occur need a SequenceMatcher pass;
+    # ratio() is not symmetric, so direction matters for an exact match with the pairwise loop.
+    needed = [[False] * n_u for _ in range(n_u)]
+    seen = [False] * n_u
+    for c in codes:
+        for p in range(n_u):
+            if seen[p] and p != c:
+                needed[p][c] = True
+        seen[c] = True
+    sim = [[1.0] * n_u for _ in range(n_u)]
+    sm = SequenceMatcher(None)
+    for q in range(n_u):
+        sm.set_seq2(uniques[q])  # b-side index (b2j) is built once per unique output
+        for p in range(n_u):
+            if not needed[p][q]:
+                continue
+            sm.set_seq1(uniques[p])
+            # Early exit: no common characters means ratio() is 0 without matching blocks
+            ratio = sm.ratio() if sm.real_quick_ratio() and sm.quick_ratio() else 0.0
+            sim[p][q] = 0.5 * _bitset_jaccard(rows[p], rows[q]) + 0.5 * ratio
+    return sim
+
+def _minhash_collision_rate(token_sets: List[List[int]], counts: List[int], num_perm: int, seed: int) -> float:
+    # Mean pairwise MinHash agreement over all C(n, 2) output pairs, computed in O(U * num_perm)
+    # by counting, per permutation, how many outputs share each minimum.
+    prime = (1 << 61) - 1
+    rng = random.Random(seed)
+    perms = [(rng.randrange(1, prime), rng.randrange(0, prime)) for _ in range(num_perm)]
+    n = sum(counts)
+    total_pairs = n * (n - 1) // 2
+    colliding = 0
+    for a, b in perms:
+        buckets: Dict[int, int] = {}
+        for ids, cnt in zip(token_sets, counts):
+            key = min(((a * x + b) % prime for x in ids), default=-1)
+            buckets[key] = buckets.get(key, 0) + cnt
+        colliding += sum(c * (c - 1) // 2 for c in buckets.values())
+    return colliding / (total_pairs * num_perm)
+
+def _token_ids(uniques: List[str]) -> List[List[int]]:
+    vocab: Dict[str, int] = {}
+    return [[vocab.setdefault(t, len(vocab)) for t in set(u.split())] for u in uniques]
+
+def _sampled_edit_ratio(uniques: List[str], codes: List[int], sample_pairs: int, seed: int) -> float:
+    # Unbiased estimate of the mean pairwise SequenceMatcher ratio from uniformly sampled
+    # (earlier, later) run pairs; each distinct ordered pair is scored at most once.
+    rng = random.Random(seed)
+    n = len(codes)
+    cache: Dict[tuple, float] = {}
+    acc = 0.0
+    for _ in range(sample_pairs):
+        i, j = rng.sample(range(n), 2)
+        p, q = codes[min(i, j)], codes[max(i, j)]
+        if p == q:
+            acc += 1.0
+            continue
+        if (p, q) not in cache:
+            cache[(p, q)] = SequenceMatcher(None, uniques[p], uniques[q]).ratio()
+        acc += cache[(p, q)]
+    return acc / sample_pairs
+
+def determinism_index(outputs: List[str], approximate: bool = False, num_perm: int = 128,
+                      sample_pairs: int = 2000, seed: int = 42) -> float:
+    """Mean pairwise 0.5 * token Jaccard + 0.5 * SequenceMatcher ratio over all runs.
+
+    Identical outputs are collapsed first and each distinct pair is compared once, so the
+    exact mode returns the same value as the naive pairwise loop. ``approximate=True`` is
+    meant for very large run counts: Jaccard is estimated with MinHash in time linear in the
+    number of distinct outputs, and the edit term from ``sample_pairs`` sampled run pairs.
+    """
     if len(outputs) < 2:
         return 1.0
+    uniques, codes = _collapse(outputs)
+    if approximate:
+        counts = [0] * len(uniques)
+        for c in codes:
+            counts[c] += 1
+        jac = _minhash_collision_rate(_token_ids(uniques), counts, num_perm, seed)
+        edit = _sampled_edit_ratio(uniques, codes, sample_pairs, seed)
+        return 0.5 * jac + 0.5 * edit
+    sim = _pair_similarity_matrix(uniques, codes)
+    # Summing cached similarities in the original (i, j) order keeps the float result bit-identical
     pairs, acc = 0, 0.0
-    for i in range(len(outputs)):
-        for j in range(i+1, len(outputs)):
-            acc += 0.5 * jaccard(outputs[i], outputs[j]) + 0.5 * levenshtein_ratio(outputs[i], outputs[j])
+    for i in range(len(codes)):
+        row = sim[codes[i]]
+        for j in range(i+1, len(codes)):
+            acc += row[codes[j]]
             pairs += 1
     return acc / pairs if pairs else 1.0
 
+class LiteralMatcher:
+    """Fixed set of literal patterns compiled once and matched against many texts.
+
+    Patterns contained in another pattern are implied by it and only searched when needed.
+    ASCII text is matched with C-level substring search (lower-cased once when
+    ``ignore_case``); other text under ``ignore_case`` goes through a single overlapping
+    regex scan so results match ``re.search(re.escape(p), text, re.IGNORECASE)`` per pattern.
+    """
+    def __init__(self, patterns: List[str], ignore_case: bool = False):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.ignore_case = ignore_case
+        keys = [p.lower() for p in self.patterns] if ignore_case else list(self.patterns)
+        self._keys = keys
+        self._ascii = all(p.isascii() for p in self.patterns)
+        n = len(keys)
+        # implied_by[i]: patterns j != i whose key contains key i (longest first)
+        self._implied_by = [[j for j in sorted(range(n), key=lambda j: -len(keys[j]))
+                             if j != i and keys[i] in keys[j] and keys[i] != keys[j]] for i in range(n)]
+        self._maximal = [i for i in range(n) if not self._implied_by[i]]
+        self._regex = None
+        self._prefixes: List[List[int]] = []
+
+    def _compile_regex(self):
+        flags = re.IGNORECASE if self.ignore_case else 0
+        order = sorted((i for i, p in enumerate(self.patterns) if p), key=lambda i: -len(self.patterns[i]))
+        self._regex = re.compile("(?=" + "|".join("(%s)" % re.escape(self.patterns[i]) for i in order) + ")", flags)
+        self._by_group = [None] + order
+        # Every pattern matching at a position is a prefix of the longest one matching there
+        self._prefixes = [[j for j, q in enumerate(self.patterns) if re.match(re.escape(q), p, flags)]
+                          for p in self.patterns]
+
+    def _fast_path(self, text: str) -> bool:
+        return not self.ignore_case or (self._ascii and text.isascii())
+
+    def contains_all(self, text: str) -> bool:
+        """True if every pattern occurs in ``text``; stops at the first missing one."""
+        if self._fast_path(text):
+            hay = text.lower() if self.ignore_case else text
+            return all(self._keys[i] in hay for i in self._maximal)
+        return len(self.find(text)) == len(self.patterns)
+
+    def find(self, text: str, with_offsets: bool = False):
+        """Patterns occurring in ``text`` in pattern order; with offsets, a {pattern: first_offset} dict."""
+        if self._fast_path(text):
+            hay = text.lower() if self.ignore_case else text
+            offsets: Dict[int, int] = {}
+            for i in sorted(range(len(self._keys)), key=lambda i: len(self._implied_by[i])):
+                if not with_offsets and any(j in offsets for j in self._implied_by[i]):
+                    offsets[i] = -1
+                    continue
+                pos = hay.find(self._keys[i])
+                if pos >= 0:
+                    offsets[i] = pos
+        else:
+            if self._regex is None:
+                self._compile_regex()
+            offsets = {i: 0 for i, p in enumerate(self.patterns) if not p}
+            for m in (self._regex.finditer(text) if len(self._by_group) > 1 else ()):
+                for j in self._prefixes[self._by_group[m.lastindex]]:
+                    offsets.setdefault(j, m.start())
+        hits = sorted(offsets)
+        if with_offsets:
+            return {self.patterns[i]: offsets[i] for i in hits}
+        return [self.patterns[i] for i in hits]
+
+def _ground_truth_source(ground_truth) -> str:
+    return json.dumps(ground_truth) if isinstance(ground_truth, dict) else str(ground_truth)
+
+class GroundTruthMatcher:
+    """Ground-truth tokens for one task, tokenized once and reused for every output scored."""
+    def __init__(self, ground_truth):
+        self.tokens = re.findall(r"[A-Za-z0-9\.\%]+", _ground_truth_source(ground_truth))
+        self._matcher = LiteralMatcher(self.tokens)
+
+    def rate(self, output: str) -> float:
+        return 0.0 if self._matcher.contains_all(output) else 1.0
+
+    def rate_many(self, outputs: List[str]) -> List[float]:
+        memo: Dict[str, float] = {}
+        return [memo[o] if o in memo else memo.setdefault(o, self.rate(o)) for o in outputs]
+
+@lru_cache(maxsize=4096)
+def _compiled_ground_truth(source: str) -> GroundTruthMatcher:
+    return GroundTruthMatcher(source)
+
+def compile_ground_truth(ground_truth) -> GroundTruthMatcher:
+    """Matcher for ``ground_truth``; build it when a task is loaded and pass it to the scorers."""
+    return _compiled_ground_truth(_ground_truth_source(ground_truth))
+
 def hallucination_rate(output: str, ground_truth) -> float:
-    # Tokenize ground truth values and check if present in output (stricter than substring check)
-    gt_tokens = []
-    if isinstance(ground_truth, dict):
-        gt_tokens = re.findall(r"[A-Za-z0-9\.\%]+", json.dumps(ground_truth))
-    else:
-        gt_tokens = re.findall(r"[A-Za-z0-9\.\%]+", str(ground_truth))
-    missing = [tok for tok in gt_tokens if tok not in output]
-    return 0.0 if not missing else 1.0
+    # Tokenize ground truth values and check if present in output (stricter than substring check).
+    # Accepts a precompiled GroundTruthMatcher; raw ground truths hit a per-process cache.
+    if not isinstance(ground_truth, GroundTruthMatcher):
+        ground_truth = compile_ground_truth(ground_truth)
+    return ground_truth.rate(output)
+
+def hallucination_rates(outputs: List[str], ground_truth) -> List[float]:
+    """Batch form of hallucination_rate for many outputs of the same task."""
+    if not isinstance(ground_truth, GroundTruthMatcher):
+        ground_truth = compile_ground_truth(ground_truth)
+    return ground_truth.rate_many(outputs)
 
 def source_prioritization_accuracy(referenced_sources: List[str], authoritative_title: str) -> float:
     return 1.0 if authoritative_title in referenced_sources else 0.0
\ No newline at end of file
@@ -2,31 +2,130 @@
 # fairness_metrics.py
 # Simple fairness metric stubs for Constrained Policy Generation (CPG) tasks
 
-from typing import List, Dict
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+import numpy as np
 
-def demographic_parity(selected: List[int], groups: List[str]) -> float:
+ArrayLike = Union[Sequence[Any], np.ndarray]
+
+
+class FairnessCounts:
+    """Per-group counts behind the fairness metrics, built in one vectorized pass per chunk.
+
+    Groups are factorized to integer codes and aggregated with ``bincount``; counts from
+    separate chunks (or processes) merge by addition, so cohorts of any size can be
+    streamed through ``update`` / ``from_chunks`` and scored once at the end.
+    """
+
+    def __init__(self):
+        self._index: Dict[Any, int] = {}
+        self.n = np.zeros(0, dtype=np.int64)               # rows per group
+        self.selected = np.zeros(0, dtype=np.float64)      # sum of `selected` per group
+        self.tp = np.zeros(0, dtype=np.int64)              # true_label == 1 and selected == 1
+        self.fn = np.zeros(0, dtype=np.int64)              # true_label == 1 and selected == 0
+        self.has_labels = False
+
+    @property
+    def groups(self):
+        return list(self._index)
+
+    def _codes(self, groups: ArrayLike) -> np.ndarray:
+        index = self._index
+        if isinstance(groups, np.ndarray) and groups.dtype.kind not in "biuf":
+            groups = groups.tolist()  # hashing beats sorting for string labels
+        if isinstance(groups, np.ndarray):
+            uniq, inverse = np.unique(groups, return_inverse=True)
+            remap = np.fromiter((index.setdefault(g, len(index)) for g in uniq.tolist()), dtype=np.int64, count=len(uniq))
+            return remap[inverse.reshape(-1)]
+        # Dict factorization keeps the original `setdefault` grouping semantics for any hashable labels;
+        # new labels are found with dict.fromkeys and every row is coded by a C-level map over the index
+        if not isinstance(groups, Sequence):
+            groups = list(groups)
+        for g in dict.fromkeys(groups):
+            index.setdefault(g, len(index))
+        return np.fromiter(map(index.__getitem__, groups), dtype=np.int64, count=len(groups))
+
+    def _grow(self, size: int):
+        if size > len(self.n):
+            pad = size - len(self.n)
+            self.n = np.concatenate([self.n, np.zeros(pad, dtype=np.int64)])
+            self.selected = np.concatenate([self.selected, np.zeros(pad, dtype=np.float64)])
+            self.tp = np.concatenate([self.tp, np.zeros(pad, dtype=np.int64)])
+            self.fn = np.concatenate([self.fn, np.zeros(pad, dtype=np.int64)])
+
+    def update(self, selected: ArrayLike, groups: ArrayLike, true_labels: Optional[ArrayLike] = None) -> "FairnessCounts":
+        # Like zip(), rows beyond the shortest input are ignored
+        codes = self._codes(groups)
+        sel = np.asarray(selected)
+        m = min(len(codes), len(sel)) if true_labels is None else min(len(codes), len(sel), len(true_labels))
+        codes, sel = codes[:m], sel[:m]
+        g = len(self._index)
+        self._grow(g)
+        self.n += np.bincount(codes, minlength=g)
+        self.selected += np.bincount(codes, weights=sel.astype(np.float64), minlength=g)
+        if true_labels is not None:
+            self.has_labels = True
+            pos = np.asarray(true_labels)[:m] == 1
+            self.tp += np.bincount(codes[pos & (sel == 1)], minlength=g)
+            self.fn += np.bincount(codes[pos & (sel == 0)], minlength=g)
+        return self
+
+    def merge(self, other: "FairnessCounts") -> "FairnessCounts":
+        remap = np.fromiter((self._index.setdefault(g, len(self._index)) for g in other._index),
+                            dtype=np.int64, count=len(other._index))
+        self._grow(len(self._index))
+        np.add.at(self.n, remap, other.n)
+        np.add.at(self.selected, remap, other.selected)
+        np.add.at(self.tp, remap, other.tp)
+        np.add.at(self.fn, remap, other.fn)
+        self.has_labels = self.has_labels or other.has_labels
+        return self
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Tuple[ArrayLike, ...]]) -> "FairnessCounts":
+        """Chunks are ``(selected, groups)`` or ``(true_labels, selected, groups)`` tuples."""
+        counts = cls()
+        for chunk in chunks:
+            if len(chunk) == 3:
+                counts.update(chunk[1], chunk[2], chunk[0])
+            else:
+                counts.update(*chunk)
+        return counts
+
+    def selection_rates(self) -> np.ndarray:
+        seen = self.n > 0
+        return self.selected[seen] / self.n[seen]
+
+
+def _counts(selected: Union[ArrayLike, FairnessCounts], groups: Optional[ArrayLike],
+            true_labels: Optional[ArrayLike] = None) -> FairnessCounts:
+    if isinstance(selected, FairnessCounts):
+        return selected
+    return FairnessCounts().update(selected, groups, true_labels)
+
+
+def demographic_parity(selected: Union[ArrayLike, FairnessCounts], groups: Optional[ArrayLike] = None) -> float:
     """Compute demographic parity: average selection rate across groups."""
-    rates = {}
-    for sel, g in zip(selected, groups):
-        rates.setdefault(g, []).append(sel)
-    group_rates = [sum(v)/len(v) for v in rates.values()]
-    return min(group_rates) / max(group_rates) if max(group_rates) > 0 else 0.0
+    rates = _counts(selected, groups).selection_rates()
+    if not len(rates):
+        raise ValueError("demographic_parity() needs at least one row")
+    lo, hi = float(rates.min()), float(rates.max())
+    return lo / hi if hi > 0 else 0.0
+
 
-def equal_opportunity(true_labels: List[int], selected: List[int], groups: List[str]) -> Dict[str, float]:
+def equal_opportunity(true_labels: Union[ArrayLike, FairnessCounts], selected: Optional[ArrayLike] = None,
+                      groups: Optional[ArrayLike] = None) -> Dict[Any, float]:
     """Compute TPR by group."""
-    tprs = {}
-    for g in set(groups):
-        tp = sum(1 for t,s,gg in zip(true_labels, selected, groups) if gg==g and t==1 and s==1)
-        fn = sum(1 for t,s,gg in zip(true_labels, selected, groups) if gg==g and t==1 and s==0)
-        denom = tp+fn
-        tprs[g] = tp/denom if denom>0 else 0.0
-    return tprs
-
-def disparate_impact(selected: List[int], groups: List[str]) -> float:
+    if isinstance(true_labels, FairnessCounts):
+        counts = true_labels
+    else:
+        counts = FairnessCounts().update(selected, groups, true_labels)
+    denom = counts.tp + counts.fn
+    return {g: (int(counts.tp[i]) / int(denom[i]) if denom[i] > 0 else 0.0)
+            for i, g in enumerate(counts.groups)}
+
+
+def disparate_impact(selected: Union[ArrayLike, FairnessCounts], groups: Optional[ArrayLike] = None) -> float:
     """Compute disparate impact ratio (80% rule)."""
-    rates = {}
-    for sel, g in zip(selected, groups):
-        rates.setdefault(g, []).append(sel)
-    group_rates = [sum(v)/len(v) for v in rates.values()]
-    if len(group_rates) < 2: return 1.0
-    return min(group_rates) / max(group_rates)
+    rates = _counts(selected, groups).selection_rates()
+    if len(rates) < 2: return 1.0
+    return float(rates.min()) / float(rates.max())
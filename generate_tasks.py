@@ -0,0 +1,191 @@
+# generate_tasks.py
+# Seeded synthetic AFV/MSR/CPG task corpora shaped like tasksUpdate.jsonl, streamed to JSONL (optionally sharded)
+
+from __future__ import annotations
+import argparse, json, random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+AFV, MSR, CPG = ("Adversarial Fact Verification", "Multi-Step Tool-Augmented Reasoning",
+                 "Constrained Policy Generation")
+PREFIX = {AFV: "AFV", MSR: "MSR", CPG: "CPG"}
+MSR_TASK = "Calculate CAGR and assess debt-to-revenue trend"
+FILLER_WORDS = ("analysts noted the figure was revised after review of preliminary data from regional "
+                "offices and independent estimates while commentators disputed the methodology").split()
+
+
+class TaskTemplates:
+    """Phrasing pools (questions, source titles/content, scenarios, constraints) drawn from a task file."""
+
+    def __init__(self, path: str):
+        self.afv: List[Dict[str, Any]] = []
+        self.cpg: List[Dict[str, Any]] = []
+        self.distractors: List[Dict[str, str]] = []
+        self.constraints: List[str] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                t = json.loads(line)
+                if t.get("task_set") == AFV and "authoritative_source" in t:
+                    self.afv.append(t)
+                    self.distractors += [s for s in t["sources"] if s["title"] != t["authoritative_source"]]
+                elif t.get("task_set") == CPG:
+                    self.cpg.append(t)
+                    self.constraints += [c for c in t.get("constraints", []) if c not in self.constraints]
+        if not self.afv or not self.cpg:
+            raise ValueError(f"{path}: need at least one AFV task with authoritative_source and one CPG task")
+
+
+class TaskGenerator:
+    """Task ``i`` depends only on (seed, i), so any shard or range can be generated independently
+    and concatenating shards reproduces the unsharded file byte for byte."""
+
+    def __init__(self, templates: TaskTemplates, seed: int = 42, mix: Optional[Dict[str, float]] = None,
+                 num_sources: int = 3, source_chars: int = 0, years: Tuple[int, int] = (3, 5),
+                 num_constraints: Optional[int] = None):
+        self.templates = templates
+        self.seed = seed
+        mix = mix or {AFV: 1.0, MSR: 1.0, CPG: 1.0}
+        self.sets = [s for s in (AFV, MSR, CPG) if mix.get(s, 0) > 0]
+        self.weights = [mix[s] for s in self.sets]
+        if not self.sets:
+            raise ValueError("task mix selects no task sets")
+        self.num_sources = max(2, num_sources)
+        self.source_chars = source_chars
+        self.years = years
+        self.num_constraints = num_constraints
+        # One shared filler blob; per-source padding is a slice of it at a random offset
+        rng = random.Random(seed)
+        self._filler = " ".join(rng.choice(FILLER_WORDS) for _ in range(max(64, source_chars // 3)))
+
+    def _pad(self, rng: random.Random, content: str) -> str:
+        missing = self.source_chars - len(content)
+        if missing <= 1:
+            return content
+        start = self._filler.find(" ", rng.randrange(max(1, len(self._filler) - missing - 16))) + 1
+        return content + " " + self._filler[start:start + missing - 1]
+
+    def _afv(self, rng: random.Random, tid: str) -> Dict[str, Any]:
+        tpl = rng.choice(self.templates.afv)
+        auth = next(s for s in tpl["sources"] if s["title"] == tpl["authoritative_source"])
+        sources = [{"title": auth["title"], "content": self._pad(rng, auth["content"])}]
+        titles = {auth["title"]}
+        while len(sources) < self.num_sources:
+            d = rng.choice(self.templates.distractors)
+            title = d["title"] if d["title"] not in titles else f"{d['title']} #{len(sources)}"
+            titles.add(title)
+            sources.append({"title": title, "content": self._pad(rng, d["content"])})
+        rng.shuffle(sources)
+        return {"task_set": AFV, "id": tid, "sources": sources, "question": tpl["question"],
+                "ground_truth": tpl["ground_truth"], "authoritative_source": tpl["authoritative_source"]}
+
+    def _msr(self, rng: random.Random, tid: str) -> Dict[str, Any]:
+        n = rng.randint(*self.years)
+        year = rng.randint(2000, 2024 - n)
+        revenue = rng.uniform(50, 500)
+        ratio = rng.uniform(0.2, 0.9)
+        filings = []
+        for k in range(n):
+            filings.append({"year": year + k, "revenue": max(1, round(revenue)), "debt": max(0, round(revenue * ratio))})
+            revenue *= 1 + rng.uniform(-0.12, 0.25)
+            ratio = min(1.5, max(0.05, ratio + rng.uniform(-0.08, 0.06)))
+        first, last = filings[0], filings[-1]
+        cagr = (last["revenue"] / first["revenue"]) ** (1 / (n - 1)) - 1
+        improving = last["debt"] / last["revenue"] < first["debt"] / first["revenue"]
+        return {"task_set": MSR, "id": tid, "filings": filings, "task": MSR_TASK,
+                "ground_truth": {"CAGR": f"{cagr * 100:.2f}%",
+                                 "trend": f"Debt-to-revenue {'improving' if improving else 'worsening'}"}}
+
+    def _cpg(self, rng: random.Random, tid: str) -> Dict[str, Any]:
+        tpl = rng.choice(self.templates.cpg)
+        constraints = list(tpl["constraints"])
+        if self.num_constraints is not None:
+            extra = [c for c in self.templates.constraints if c not in constraints]
+            rng.shuffle(extra)
+            constraints = (constraints + extra)[:max(1, self.num_constraints)]
+        return {"task_set": CPG, "id": tid, "scenario": tpl["scenario"], "constraints": constraints,
+                "ground_truth": tpl["ground_truth"]}
+
+    def task(self, i: int) -> Dict[str, Any]:
+        rng = random.Random(self.seed * 1_000_003 + i)
+        tset = rng.choices(self.sets, self.weights)[0]
+        tid = f"{PREFIX[tset]}-G{i:09d}"
+        if tset == AFV:
+            return self._afv(rng, tid)
+        if tset == MSR:
+            return self._msr(rng, tid)
+        return self._cpg(rng, tid)
+
+    def iter_tasks(self, start: int, stop: int) -> Iterator[Dict[str, Any]]:
+        for i in range(start, stop):
+            yield self.task(i)
+
+
+def shard_range(n: int, shard: int, shards: int) -> Tuple[int, int]:
+    return n * shard // shards, n * (shard + 1) // shards
+
+
+def shard_path(out: str, shard: int, shards: int) -> Path:
+    p = Path(out)
+    if shards == 1:
+        return p
+    return p.with_name(f"{p.stem}.{shard:05d}-of-{shards:05d}{p.suffix}")
+
+
+def write_tasks(gen: TaskGenerator, path: Path, start: int, stop: int, batch: int = 1000) -> int:
+    """Stream tasks [start, stop) to ``path``; memory stays bounded by ``batch`` lines."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        buf = []
+        for t in gen.iter_tasks(start, stop):
+            buf.append(json.dumps(t, ensure_ascii=False))
+            if len(buf) >= batch:
+                f.write("\n".join(buf) + "\n")
+                buf.clear()
+        if buf:
+            f.write("\n".join(buf) + "\n")
+    return stop - start
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    names = {"afv": AFV, "msr": MSR, "cpg": CPG}
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip().lower() not in names:
+            raise ValueError(f"unknown task set in --mix: {name!r} (expected afv, msr, cpg)")
+        mix[names[name.strip().lower()]] = float(weight or 1)
+    return mix
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a reproducible synthetic task corpus")
+    ap.add_argument("--n", type=int, required=True, help="number of tasks")
+    ap.add_argument("--out", default="tasks_synthetic.jsonl")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--templates", default=str(Path(__file__).resolve().parent / "tasksUpdate.jsonl"))
+    ap.add_argument("--mix", default="afv=1,msr=1,cpg=1", help="relative task-set weights")
+    ap.add_argument("--num_sources", type=int, default=3, help="sources per AFV task (>= 2)")
+    ap.add_argument("--source_chars", type=int, default=0, help="pad each AFV source content to this length")
+    ap.add_argument("--years", default="3,5", help="min,max filings per MSR task")
+    ap.add_argument("--num_constraints", type=int, default=None, help="constraints per CPG task (default: template's)")
+    ap.add_argument("--shards", type=int, default=1, help="split output into N contiguous files")
+    ap.add_argument("--shard_index", type=int, default=None, help="only write this shard (for parallel generation)")
+    args = ap.parse_args()
+
+    lo, hi = (int(x) for x in args.years.split(","))
+    if lo < 2 or hi < lo:
+        ap.error("--years needs 2 <= min <= max")
+    gen = TaskGenerator(TaskTemplates(args.templates), seed=args.seed, mix=parse_mix(args.mix),
+                        num_sources=args.num_sources, source_chars=args.source_chars, years=(lo, hi),
+                        num_constraints=args.num_constraints)
+    shards = range(args.shards) if args.shard_index is None else [args.shard_index]
+    for k in shards:
+        path = shard_path(args.out, k, args.shards)
+        written = write_tasks(gen, path, *shard_range(args.n, k, args.shards))
+        print(f"Wrote {written} tasks to {path}")
+
+
+if __name__ == "__main__":
+    main()
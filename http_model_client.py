@@ -0,0 +1,117 @@
+# http_model_client.py
+# Pooled keep-alive HTTP ModelClient; errors map to the names ErrorRecoveryHandler classifies on
+
+from __future__ import annotations
+import datetime, email.utils, http.client, json, queue, socket, threading, time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+
+class HTTPError_429(Exception):
+    """Rate limited; ``retry_after`` carries the server's Retry-After in seconds, if any."""
+    def __init__(self, message: str = "HTTPError_429", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header: delta-seconds or an HTTP-date (clamped at 0); None if absent or malformed."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:  # "-0000" zone: RFC 5322 leaves it unspecified, HTTP dates are GMT
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HTTPError_400(Exception):
+    """Request rejected by the model endpoint."""
+
+
+class HTTPModelClient:
+    """POSTs ``{"task": task}`` to ``base_url + path`` and returns the ``output`` field.
+
+    Up to ``pool_size`` persistent connections are shared across threads; callers beyond
+    that wait for a free connection, so concurrent harness workers keep every connection
+    busy without reconnecting. Timeouts raise TimeoutError, 429 raises HTTPError_429 and
+    400 raises HTTPError_400.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 8, timeout_s: float = 30.0,
+                 path: str = "/v1/answer", headers: Optional[Dict[str, str]] = None,
+                 name: Optional[str] = None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port
+        self.path = (parts.path.rstrip("/") + path) if parts.path else path
+        self.timeout_s = timeout_s
+        self.pool_size = pool_size
+        self.headers = {"Content-Type": "application/json", "Connection": "keep-alive", **(headers or {})}
+        self.name = name or f"http:{self.host}:{self.port}{self.path}"
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._lock:  # called from every worker thread
+            self.connections_opened += 1
+        return cls(self.host, self.port, timeout=self.timeout_s)
+
+    def _request(self, conn: http.client.HTTPConnection, body: bytes):
+        conn.request("POST", self.path, body=body, headers=self.headers)
+        resp = conn.getresponse()
+        return resp, resp.read()  # drain fully so the connection can be reused
+
+    def call(self, task: Dict[str, Any]) -> str:
+        body = json.dumps({"task": task}).encode("utf-8")
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            try:
+                try:
+                    resp, data = self._request(conn, body)
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    if not reused:
+                        raise
+                    # Server closed an idle keep-alive connection; retry once on a fresh one
+                    conn.close()
+                    conn = self._connect()
+                    resp, data = self._request(conn, body)
+            except socket.timeout as e:
+                conn.close()
+                raise TimeoutError(f"model call timed out after {self.timeout_s}s") from e
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        if resp.status == 429:
+            raise HTTPError_429(retry_after=parse_retry_after(resp.getheader("Retry-After")))
+        if resp.status == 400:
+            raise HTTPError_400(data.decode("utf-8", "replace")[:200])
+        if resp.status in (408, 504):
+            raise TimeoutError(f"HTTP {resp.status}")
+        if resp.status != 200:
+            raise RuntimeError(f"HTTP {resp.status}")
+        return json.loads(data)["output"]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
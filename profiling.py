@@ -0,0 +1,196 @@
+# profiling.py
+# --profile support for the harnesses and scorer: sampled cProfile, collapsed stacks and per-phase tracemalloc
+
+from __future__ import annotations
+import argparse, io, json, os, sys, threading, tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+import trace_spans
+
+# Allocations made by the profiler's own machinery are not attributed to phases
+_OWN_FILES = (tracemalloc.__file__, __file__, "*/contextlib.py")
+
+
+def add_profile_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--profile", action="store_true",
+                    help="write <out>.profile.{pstats,txt,collapsed,malloc.json} next to the output file")
+    ap.add_argument("--profile_sample", type=int, default=10,
+                    help="cProfile and tracemalloc only every Nth task/row (1 = all)")
+    ap.add_argument("--profile_interval_ms", type=float, default=5.0,
+                    help="stack sampling interval for the collapsed-stack (flamegraph) file; 0 disables")
+    ap.add_argument("--profile_malloc_frames", type=int, default=1,
+                    help="tracemalloc traceback depth; 0 disables allocation tracking")
+    ap.add_argument("--profile_top", type=int, default=25, help="allocators kept per phase")
+
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's stack at a fixed interval; counts are in collapsed-stack form."""
+
+    def __init__(self, interval_s: float):
+        super().__init__(name="profile-stack-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval_s):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RunProfiler:
+    """Profiles a run in units of work (one task or result row each).
+
+    Every ``sample_every``-th unit runs under cProfile, and phases inside it (the trace_spans
+    phases plus any ``phase()`` the script declares) are traced with tracemalloc; the stack
+    sampler runs for the whole run at ``interval_ms``. A disabled profiler is a no-op.
+    """
+
+    def __init__(self, out_path: str, enabled: bool = True, sample_every: int = 1, interval_ms: float = 5.0,
+                 malloc_frames: int = 1, top_n: int = 25):
+        out = Path(out_path)
+        self.base = out.with_name(out.stem + ".profile")
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.interval_ms = interval_ms
+        self.malloc_frames = malloc_frames
+        self.top_n = top_n
+        self.units = 0
+        self.sampled_units = 0
+        self._unit_sampled: Optional[bool] = None  # None: outside any unit
+        self._cprofile_on = False
+        self._phase: Optional[str] = None
+        self._owner = threading.get_ident()
+        self._cprofile = None
+        if enabled:
+            import cProfile  # with pstats, only loaded for --profile runs
+            self._cprofile = cProfile.Profile()
+        self._sampler: Optional[StackSampler] = None
+        self._allocs: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace, out_path: str) -> "RunProfiler":
+        return cls(out_path, args.profile, args.profile_sample, args.profile_interval_ms,
+                   args.profile_malloc_frames, args.profile_top)
+
+    def __enter__(self) -> "RunProfiler":
+        if self.enabled:
+            if self.interval_ms > 0:
+                self._sampler = StackSampler(self.interval_ms / 1000)
+                self._sampler.start()
+            trace_spans.set_phase_hook(self.phase)
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            trace_spans.set_phase_hook(None)
+            if self._sampler is not None:
+                self._sampler.stop()
+            self.write()
+        return False
+
+    @contextmanager
+    def unit(self) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        sampled = self.units % self.sample_every == 0
+        self.units += 1
+        self._unit_sampled = sampled
+        if sampled:
+            self.sampled_units += 1
+            self._cprofile.enable()
+            self._cprofile_on = True
+        try:
+            yield
+        finally:
+            if sampled:
+                self._cprofile.disable()
+                self._cprofile_on = False
+            self._unit_sampled = None
+
+    def iter_units(self, items: Iterable[Any]) -> Iterator[Any]:
+        """Yield ``items`` with each one's production and the caller's loop body as one unit."""
+        if not self.enabled:
+            yield from items
+            return
+        it = iter(items)
+        while True:
+            with self.unit():
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                yield item
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Phases don't nest (the outer one owns the allocations); worker threads are not tracked
+        if (not self.enabled or not self.malloc_frames or self._phase is not None or self._unit_sampled is False
+                or threading.get_ident() != self._owner):
+            yield
+            return
+        self._phase = name
+        tracemalloc.start(self.malloc_frames)
+        try:
+            yield
+        finally:
+            if self._cprofile_on:  # keep snapshot cost out of the CPU profile
+                self._cprofile.disable()
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._phase = None
+            self._record(name, snapshot, peak)
+            if self._cprofile_on:
+                self._cprofile.enable()
+
+    def _record(self, name: str, snapshot: tracemalloc.Snapshot, peak: int):
+        entry = self._allocs.setdefault(name, {"samples": 0, "peak_bytes_max": 0, "sites": {}})
+        entry["samples"] += 1
+        entry["peak_bytes_max"] = max(entry["peak_bytes_max"], peak)
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, f) for f in _OWN_FILES])
+        for stat in snapshot.statistics("traceback" if self.malloc_frames > 1 else "lineno"):
+            where = " <- ".join(f"{os.path.basename(f.filename)}:{f.lineno}" for f in stat.traceback)
+            site = entry["sites"].setdefault(where, [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+
+    def write(self):
+        import pstats
+        self.base.parent.mkdir(parents=True, exist_ok=True)
+        pstats_path = self.base.with_name(self.base.name + ".pstats")
+        self._cprofile.dump_stats(str(pstats_path))
+        buf = io.StringIO()
+        try:
+            pstats.Stats(str(pstats_path), stream=buf).sort_stats("cumulative").print_stats(40)
+        except TypeError:  # nothing was profiled
+            buf.write("no profile data\n")
+        self.base.with_name(self.base.name + ".txt").write_text(buf.getvalue(), encoding="utf-8")
+        if self._sampler is not None:
+            with open(self.base.with_name(self.base.name + ".collapsed"), "w", encoding="utf-8") as f:
+                for stack, n in sorted(self._sampler.counts.items()):
+                    f.write(f"{stack} {n}\n")
+        phases = {}
+        for name, entry in sorted(self._allocs.items()):
+            top = sorted(entry["sites"].items(), key=lambda kv: kv[1][0], reverse=True)[:self.top_n]
+            phases[name] = {"samples": entry["samples"], "peak_bytes_max": entry["peak_bytes_max"],
+                            "top": [{"where": w, "size_bytes": s, "count": c} for w, (s, c) in top]}
+        report = {"units": self.units, "sampled_units": self.sampled_units, "sample_every": self.sample_every,
+                  "interval_ms": self.interval_ms, "malloc_frames": self.malloc_frames, "phases": phases}
+        self.base.with_name(self.base.name + ".malloc.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote profile to {self.base}.*")
@@ -0,0 +1,123 @@
+# response_cache.py
+# Content-addressed, disk-backed cache of model responses with size-based LRU eviction
+
+from __future__ import annotations
+import hashlib, json, os, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def content_key(payload: Any, identity: Dict[str, Any]) -> str:
+    """sha256 over canonical JSON of the payload plus client identity/parameters."""
+    blob = json.dumps({"payload": payload, "identity": identity}, sort_keys=True,
+                      separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """One JSON file per key under ``root/<2-hex>/``; least recently used entries are evicted
+    once the store exceeds ``max_bytes``. Recency survives restarts via file mtimes."""
+
+    def __init__(self, root: str, max_bytes: int = 1 << 30):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        if not self.root.exists():
+            return
+        entries = []
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                for e in os.scandir(shard.path):
+                    if e.name.endswith(".json"):
+                        st = e.stat()
+                        entries.append((st.st_mtime, e.name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._drop(key)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return value
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                old = next(iter(self._index))
+                self._drop(old)
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        self._bytes -= self._index.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._index), "bytes": self._bytes}
+
+
+class CachingModelClient:
+    """ModelClient wrapper that answers repeated task payloads from a ResponseCache.
+
+    ``sample`` separates repeated runs of the same task, so a determinism sweep replays each
+    run's own response instead of collapsing them to one. Errors are never cached; set
+    ``bypass`` (or pass ``fresh=True``) when a run needs a fresh sample from the model.
+    """
+
+    def __init__(self, inner: Any, cache: ResponseCache, params: Optional[Dict[str, Any]] = None,
+                 bypass: bool = False):
+        self.inner = inner
+        self.cache = cache
+        self.bypass = bypass
+        self.name = getattr(inner, "name", None) or type(inner).__name__
+        self.identity = {"client": self.name, "params": params or {}}
+
+    def call(self, task: Dict[str, Any], sample: int = 0, fresh: bool = False) -> str:
+        if self.bypass or fresh:
+            return self.inner.call(task)
+        key = content_key({"task": task, "sample": sample}, self.identity)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit["response"]
+        response = self.inner.call(task)
+        self.cache.put(key, {"response": response})
+        return response
@@ -0,0 +1,313 @@
+# results_store.py
+# Columnar results store: the JSONL rows verbatim plus contiguous NumPy columns of the scored fields
+
+from __future__ import annotations
+import argparse, json, mmap, os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from blob_store import is_ref
+
+FORMAT = "columnar-results"
+VERSION = 1
+NUMERIC = ("determinism_index", "hallucination_rate", "source_prioritization_accuracy", "latency_ms")
+STRINGS = ("id", "last_output", "trace_text")
+# Value kinds in <name>.kind.npy
+MISSING, INT, FLOAT = 0, 1, 2
+_EXACT_INT = 1 << 53
+
+
+def is_columnar(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def _perf(record: Dict[str, Any]) -> Dict[str, Any]:
+    # Same lookup as score_row: metrics.performance_efficiency, else the recovery trace's
+    metrics = record.get("metrics", {})
+    if "performance_efficiency" in metrics:
+        return metrics["performance_efficiency"]
+    trace = record.get("trace")
+    if isinstance(trace, dict) and "performance_efficiency" in trace:
+        return trace["performance_efficiency"]
+    return {}
+
+
+def _numeric(v: Any) -> Tuple[int, float, bool]:
+    """(kind, value, exact); exact is False for values a float64 column can't round-trip."""
+    if isinstance(v, bool):
+        return MISSING, 0.0, False
+    if isinstance(v, int):
+        return INT, float(v), -_EXACT_INT <= v <= _EXACT_INT
+    if isinstance(v, float):
+        return FLOAT, v, True
+    return MISSING, 0.0, True
+
+
+class _StringColumnWriter:
+    def __init__(self, root: Path, name: str):
+        self.base = root / f"str.{name}"
+        self._f = open(root / f"str.{name}.bin", "wb")
+        self.offsets = array("q", [0])
+        self.kinds = array("B")
+
+    def add(self, value: Optional[str]):
+        if value is None:
+            self.kinds.append(MISSING)
+        else:
+            self._f.write(value.encode("utf-8"))
+            self.kinds.append(1)
+        self.offsets.append(self._f.tell())
+
+    def close(self):
+        self._f.close()
+        np.save(f"{self.base}.off.npy", np.frombuffer(self.offsets, dtype=np.int64))
+        np.save(f"{self.base}.kind.npy", np.frombuffer(self.kinds, dtype=np.uint8))
+
+
+class JSONLResultsWriter:
+    def __init__(self, path: str, resume_offset: Optional[int] = None):
+        # resume_offset: keep the first that many bytes of an existing file (a checkpoint's) and append
+        if resume_offset is not None:
+            with open(path, "r+b") as f:
+                f.truncate(resume_offset)
+        self._f = open(path, "w" if resume_offset is None else "a", encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]):
+        self._f.write(json.dumps(record) + "\n")
+
+    def sync(self) -> int:
+        """Flush everything written to disk; returns the byte offset the rows end at."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.buffer.tell()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarResultsWriter(JSONLResultsWriter):
+    """Writes ``path/`` with rows.jsonl (exactly what JSONLResultsWriter writes) plus columns.
+
+    Rows whose scored fields don't fit the columns exactly (bool metrics, huge ints, non-string
+    outputs, explicit referenced_sources, ...) are flagged in fallback.npy; readers re-parse them.
+    """
+
+    def __init__(self, path: str, resume_offset: Optional[int] = None):
+        self.root = Path(path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        prior = self.root / "rows.jsonl.resume"
+        if resume_offset is not None and not prior.exists():  # (left over if a resume was itself cut short)
+            os.replace(self.root / "rows.jsonl", prior)
+        self._f = open(self.root / "rows.jsonl", "w", encoding="utf-8")
+        self._offsets = array("q", [0])
+        self._pos = 0
+        self._values = {k: array("d") for k in NUMERIC}
+        self._kinds = {k: array("B") for k in NUMERIC}
+        self._strings = {k: _StringColumnWriter(self.root, k) for k in STRINGS}
+        self._task_sets: Dict[str, int] = {}
+        self._task_set_codes = array("h")
+        self._span_names: Dict[str, int] = {}
+        self._span_row, self._span_name, self._span_ns = array("q"), array("i"), array("q")
+        self._fallback = array("B")
+        self.rows = 0
+        if resume_offset is not None and prior.exists():
+            # Columns are only written on close, so they are rebuilt from the rows kept
+            with open(prior, "rb") as f:
+                for line in f:
+                    if self._pos + len(line) > resume_offset:
+                        break
+                    text = line.decode("utf-8").rstrip("\n")
+                    self.add(json.loads(text), text)
+            prior.unlink()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record)
+        self.add(record, line)
+
+    def add(self, record: Dict[str, Any], line: str):
+        data = (line + "\n").encode("utf-8")
+        self._f.write(line + "\n")
+        self._pos += len(data)
+        self._offsets.append(self._pos)
+        exact = True
+        metrics = record.get("metrics", {})
+        perf = _perf(record)
+        for k in NUMERIC:
+            kind, value, ok = _numeric(perf.get("latency_ms") if k == "latency_ms" else metrics.get(k))
+            self._values[k].append(value)
+            self._kinds[k].append(kind)
+            exact = exact and ok
+        tid = record.get("id")
+        self._strings["id"].add(tid if isinstance(tid, str) else None)
+        exact = exact and (tid is None or isinstance(tid, str))
+        out = record.get("last_output", record.get("output", ""))
+        self._strings["last_output"].add(out if isinstance(out, str) else None)
+        exact = exact and (not out or isinstance(out, str))
+        trace = record.get("trace", "")
+        if isinstance(trace, dict) and not is_ref(trace):  # a blob reference stays a non-string: fallback
+            trace = trace.get("reasoning_trace", "")
+        self._strings["trace_text"].add(trace if isinstance(trace, str) else None)
+        exact = exact and (not trace or isinstance(trace, str)) and not record.get("referenced_sources")
+        tset = record.get("task_set")
+        if isinstance(tset, str):
+            self._task_set_codes.append(self._task_sets.setdefault(tset, len(self._task_sets)))
+        else:
+            # Resolved from the task file when absent; anything else is scored row by row
+            self._task_set_codes.append(-1)
+            exact = exact and "task_set" not in record
+        for sp in perf.get("spans") or () if isinstance(perf, dict) else ():
+            name, ns = sp.get("name"), sp.get("duration_ns")
+            if not isinstance(name, str) or type(ns) is not int:
+                exact = False
+                continue
+            self._span_row.append(self.rows)
+            self._span_name.append(self._span_names.setdefault(name, len(self._span_names)))
+            self._span_ns.append(ns)
+        self._fallback.append(0 if exact else 1)
+        self.rows += 1
+
+    def sync(self) -> int:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._pos
+
+    def close(self):
+        self._f.close()
+
+        def save(name, arr, dtype):
+            np.save(self.root / name, np.frombuffer(arr, dtype=dtype))
+
+        save("rows.off.npy", self._offsets, np.int64)
+        for k in NUMERIC:
+            save(f"num.{k}.npy", self._values[k], np.float64)
+            save(f"num.{k}.kind.npy", self._kinds[k], np.uint8)
+        for col in self._strings.values():
+            col.close()
+        save("task_set.npy", self._task_set_codes, np.int16)
+        save("spans.row.npy", self._span_row, np.int64)
+        save("spans.name.npy", self._span_name, np.int32)
+        save("spans.ns.npy", self._span_ns, np.int64)
+        save("fallback.npy", self._fallback, np.uint8)
+        meta = {"format": FORMAT, "version": VERSION, "rows": self.rows, "numeric": list(NUMERIC),
+                "strings": list(STRINGS), "task_sets": list(self._task_sets), "span_names": list(self._span_names)}
+        (self.root / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+
+def open_results_writer(path: str, fmt: str = "jsonl", resume_offset: Optional[int] = None) -> JSONLResultsWriter:
+    if fmt == "columnar":
+        return ColumnarResultsWriter(path, resume_offset)
+    if fmt != "jsonl":
+        raise ValueError(f"unknown results format: {fmt}")
+    return JSONLResultsWriter(path, resume_offset)
+
+
+class StringColumn:
+    def __init__(self, root: Path, name: str):
+        with open(root / f"str.{name}.bin", "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.offsets = np.load(root / f"str.{name}.off.npy", mmap_mode="r")
+        self.kinds = np.load(root / f"str.{name}.kind.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if not self.kinds[i]:
+            return None
+        return self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def take(self, rows: np.ndarray) -> List[Optional[str]]:
+        """Values for many rows at once (one vectorized offset lookup instead of one per row)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        blob = self._blob
+        return [blob[a:b].decode("utf-8") if k else None
+                for a, b, k in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist(), self.kinds[rows].tolist())]
+
+
+class ColumnarResults:
+    """Read side of a ColumnarResultsWriter directory; numeric columns are memory-mapped."""
+
+    def __init__(self, path: str):
+        self.root = Path(path)
+        self.meta = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("format") != FORMAT or self.meta.get("version") != VERSION:
+            raise ValueError(f"{path}: not a {FORMAT} v{VERSION} store")
+        self.rows = self.meta["rows"]
+        self.task_set_names: List[str] = self.meta["task_sets"]
+        self.span_names: List[str] = self.meta["span_names"]
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.root / name, mmap_mode="r")
+
+    def numeric(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(values, kinds) for a metric column; kinds are MISSING/INT/FLOAT."""
+        return self._load(f"num.{name}.npy"), self._load(f"num.{name}.kind.npy")
+
+    def strings(self, name: str) -> StringColumn:
+        return StringColumn(self.root, name)
+
+    def task_set_codes(self) -> np.ndarray:
+        return self._load("task_set.npy")
+
+    def spans(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self._load("spans.row.npy"), self._load("spans.name.npy"), self._load("spans.ns.npy")
+
+    def fallback(self) -> np.ndarray:
+        return self._load("fallback.npy")
+
+    def row(self, i: int) -> Dict[str, Any]:
+        offsets = self._load("rows.off.npy")
+        with open(self.root / "rows.jsonl", "rb") as f:
+            f.seek(int(offsets[i]))
+            return json.loads(f.read(int(offsets[i + 1] - offsets[i])))
+
+    def iter_lines(self) -> Iterator[str]:
+        with open(self.root / "rows.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for line in self.iter_lines():
+            yield json.loads(line)
+
+    def to_jsonl(self, path: str):
+        """Byte-identical to the JSONL the harness would have written."""
+        with open(self.root / "rows.jsonl", "rb") as src, open(path, "wb") as dst:
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    return
+                dst.write(chunk)
+
+
+def jsonl_to_columnar(src: str, dst: str) -> int:
+    with open(src, "r", encoding="utf-8") as f, ColumnarResultsWriter(dst) as w:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.strip():
+                w.add(json.loads(line), line)
+        return w.rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert results between JSONL and the columnar store")
+    ap.add_argument("direction", choices=["to-columnar", "to-jsonl"])
+    ap.add_argument("src")
+    ap.add_argument("dst")
+    args = ap.parse_args()
+    if args.direction == "to-columnar":
+        print(f"Wrote {jsonl_to_columnar(args.src, args.dst)} rows to {args.dst}")
+    else:
+        ColumnarResults(args.src).to_jsonl(args.dst)
+        print(f"Wrote {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# retry_scheduler.py
+# Backoff, rate-limit-aware pacing and circuit breaking for ErrorRecoveryHandler retries
+
+from __future__ import annotations
+import random, threading, time
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_RETRY_CONFIG: Dict[str, Dict[str, Any]] = {
+    "backoff": {"base_delay_s": 0.5, "max_delay_s": 30.0, "multiplier": 2.0, "jitter": "full"},
+    "rate_limit": {"rate_per_s": None, "burst": 10, "default_retry_after_s": 1.0},
+    "circuit_breaker": {"failure_threshold": 5, "cooldown_s": 30.0, "open_action": "fallback"},
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a client whose circuit breaker is open."""
+
+
+class Backoff:
+    """Exponential backoff; ``jitter`` is "full" (0..d), "equal" (d/2..d) or "none"."""
+    def __init__(self, base_delay_s: float = 0.5, max_delay_s: float = 30.0, multiplier: float = 2.0,
+                 jitter: str = "full", rng: Optional[random.Random] = None):
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int) -> float:
+        d = min(self.max_delay_s, self.base_delay_s * self.multiplier ** max(0, attempt - 1))
+        if self.jitter == "full":
+            return self._rng.uniform(0, d)
+        if self.jitter == "equal":
+            return d / 2 + self._rng.uniform(0, d / 2)
+        return d
+
+
+class TokenBucket:
+    """Paces calls to ``rate_per_s`` (unlimited when None) and pauses after rate-limit signals."""
+    def __init__(self, rate_per_s: Optional[float] = None, burst: int = 10,
+                 default_retry_after_s: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.default_retry_after_s = default_retry_after_s
+        self._clock = clock
+        self._tokens = float(burst)
+        self._last = clock()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = self._clock()
+            wait = max(0.0, self.blocked_until - now)
+            if self.rate_per_s:
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate_per_s)
+                self._last = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate_per_s)
+            return wait
+
+    def penalize(self, retry_after_s: Optional[float] = None):
+        # Honor Retry-After (or the default pause) and drain the bucket so bursts don't resume at once
+        pause = retry_after_s if retry_after_s is not None else self.default_retry_after_s
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self._clock() + pause)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; half-opens after ``cooldown_s``, when
+    a single probe call is let through and its outcome closes or re-opens the breaker."""
+    def __init__(self, failure_threshold: int = 5, cooldown_s: float = 30.0,
+                 open_action: str = "fallback", clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.open_action = open_action
+        self._clock = clock
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.probing = False  # a half-open probe is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._clock() - self.opened_at >= self.cooldown_s else "open"
+
+    def blocked(self) -> bool:
+        """Whether ``allow`` would refuse a call right now (without claiming the probe)."""
+        state = self.state
+        return state == "open" or (state == "half-open" and self.probing)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.blocked():
+                return False
+            if self.state == "half-open":
+                self.probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half-open" or (self.opened_at is None and self.consecutive_failures >= self.failure_threshold):
+                self.opened_at = self._clock()
+                self.trips += 1
+            self.probing = False
+
+
+class RetryScheduler:
+    """Per-client pacing and breaker state plus retry/throughput counters; safe to share between
+    threads (counters are updated under a lock that is never held while sleeping or calling)."""
+    def __init__(self, config: Optional[Dict[str, Any]] = None, rng_seed: Optional[int] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        config = config or {}
+        self.config = {k: {**v, **(config.get(k) or {})} for k, v in DEFAULT_RETRY_CONFIG.items()}
+        self.sleep = sleep
+        self._clock = clock
+        self.backoff = Backoff(**self.config["backoff"], rng=random.Random(rng_seed))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.calls = 0
+        self.retry_attempts = 0
+        self.retry_successes = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.backoff_s = 0.0
+        self.throttled_s = 0.0
+        self._first_call: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def client_key(client: Any) -> str:
+        return getattr(client, "name", None) or f"{type(client).__name__}@{id(client):x}"
+
+    def bucket(self, client: Any) -> TokenBucket:
+        key = self.client_key(client)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(**self.config["rate_limit"], clock=self._clock)
+            return self._buckets[key]
+
+    def breaker(self, client: Any) -> CircuitBreaker:
+        key = self.client_key(client)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(**self.config["circuit_breaker"], clock=self._clock)
+            return self._breakers[key]
+
+    def call(self, client: Any, task: Dict[str, Any], attempt: int = 0) -> Any:
+        """Call ``client`` under pacing and breaker control; ``attempt`` > 0 marks a retry."""
+        breaker = self.breaker(client)
+        if not breaker.allow():
+            with self._lock:
+                self.short_circuited += 1
+            raise CircuitOpenError(f"circuit open for {self.client_key(client)}")
+        if attempt:
+            with self._lock:
+                self.retry_attempts += 1
+                delay = self.backoff.delay(attempt)
+                self.backoff_s += delay
+            self.sleep(delay)
+        wait = self.bucket(client).reserve()
+        if wait > 0:
+            with self._lock:
+                self.throttled_s += wait
+            self.sleep(wait)
+        with self._lock:
+            if self._first_call is None:
+                self._first_call = self._clock()
+            self.calls += 1
+        try:
+            result = client.call(task)
+        except Exception as e:
+            self.record_failure(client, type(e).__name__, getattr(e, "retry_after", None))
+            raise
+        breaker.record_success()
+        if attempt:
+            with self._lock:
+                self.retry_successes += 1
+        return result
+
+    def record_failure(self, client: Any, error_type: str, retry_after_s: Optional[float] = None):
+        self.breaker(client).record_failure()
+        if error_type == "HTTPError_429":
+            with self._lock:
+                self.rate_limited += 1
+            self.bucket(client).penalize(retry_after_s)
+
+    def checkpoint_state(self) -> Dict[str, Any]:
+        """Counters, backoff RNG and per-client pacing/breaker state; clock readings are stored
+        relative to now so they stay meaningful in the process that restores them."""
+        from checkpoint import rng_state
+        now = self._clock()
+        return {
+            "counters": {k: getattr(self, k) for k in ("calls", "retry_attempts", "retry_successes", "rate_limited",
+                                                       "short_circuited", "backoff_s", "throttled_s")},
+            "elapsed_s": now - self._first_call if self._first_call is not None else None,
+            "backoff_rng": rng_state(self.backoff._rng),
+            "buckets": {k: {"tokens": b._tokens, "blocked_for_s": max(0.0, b.blocked_until - now)}
+                        for k, b in self._buckets.items()},
+            "breakers": {k: {"consecutive_failures": b.consecutive_failures, "trips": b.trips,
+                             "open_for_s": now - b.opened_at if b.opened_at is not None else None}
+                         for k, b in self._breakers.items()},
+        }
+
+    def restore_state(self, state: Dict[str, Any], client_keys: Optional[Dict[str, str]] = None):
+        """Inverse of checkpoint_state; ``client_keys`` renames saved client keys (id-based keys change per process)."""
+        from checkpoint import set_rng_state
+        now = self._clock()
+        client_keys = client_keys or {}
+        for k, v in state["counters"].items():
+            setattr(self, k, v)
+        self._first_call = now - state["elapsed_s"] if state["elapsed_s"] is not None else None
+        set_rng_state(self.backoff._rng, state["backoff_rng"])
+        for key, b in state["buckets"].items():
+            bucket = self._buckets[client_keys.get(key, key)] = TokenBucket(**self.config["rate_limit"], clock=self._clock)
+            bucket._tokens = b["tokens"]
+            bucket.blocked_until = now + b["blocked_for_s"] if b["blocked_for_s"] else 0.0
+        for key, b in state["breakers"].items():
+            breaker = self._breakers[client_keys.get(key, key)] = CircuitBreaker(**self.config["circuit_breaker"], clock=self._clock)
+            breaker.consecutive_failures, breaker.trips = b["consecutive_failures"], b["trips"]
+            breaker.opened_at = now - b["open_for_s"] if b["open_for_s"] is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = self._clock() - self._first_call if self._first_call is not None else 0.0
+        return scheduler_stats({
+            "model_calls": self.calls,
+            "retry_attempts": self.retry_attempts,
+            "retry_successes": self.retry_successes,
+            "rate_limited": self.rate_limited,
+            "short_circuited": self.short_circuited,
+            "breaker_trips": sum(b.trips for b in self._breakers.values()),
+            "backoff_s": self.backoff_s,
+            "throttled_s": self.throttled_s,
+            "elapsed_s": elapsed,
+        })
+
+    @staticmethod
+    def merge_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine ``stats()`` of concurrent runs (shards): counters add up, and throughput is the
+        total calls over the longest run's elapsed time."""
+        counts = {k: sum(s["counts"][k] for s in stats) for k in SCHEDULER_COUNTERS}
+        counts["elapsed_s"] = max((s["counts"]["elapsed_s"] for s in stats), default=0.0)
+        return scheduler_stats(counts)
+
+
+SCHEDULER_COUNTERS = ("model_calls", "retry_attempts", "retry_successes", "rate_limited", "short_circuited",
+                      "breaker_trips", "backoff_s", "throttled_s")
+
+
+def scheduler_stats(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """The reported scheduler stats for raw ``counts``; the counts are kept (unrounded) so shards can be merged."""
+    elapsed = counts["elapsed_s"]
+    return {
+        "model_calls": counts["model_calls"],
+        "retry_attempts": counts["retry_attempts"],
+        "retry_successes": counts["retry_successes"],
+        "rate_limited": counts["rate_limited"],
+        "short_circuited": counts["short_circuited"],
+        "breaker_trips": counts["breaker_trips"],
+        "backoff_s": round(counts["backoff_s"], 4),
+        "throttled_s": round(counts["throttled_s"], 4),
+        "throughput_calls_per_s": round(counts["model_calls"] / elapsed, 4) if elapsed > 0 else None,
+        "counts": counts,
+    }
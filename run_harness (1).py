@@ -2,7 +2,9 @@ import json
 import time
 import hashlib
 import random
+from typing import Dict, Any
 from error_recovery import ErrorRecoveryHandler
+from trace_spans import span, ns_to_ms, MODEL_CALL, METRIC_EVALUATION
 try:
     from cryptography.fernet import Fernet
 except ImportError:
@@ -44,14 +46,17 @@ def main():
     results = []
     for task in tasks:
         trace = {"performance_efficiency": {"latency_ms": 0}, "retry_attempt": 0}
-        start_time = time.time()
+        perf = trace["performance_efficiency"]
+        start = time.perf_counter_ns()
         try:
-            output = handler._call_grok_api(task)
+            with span(perf, MODEL_CALL):
+                output = handler._call_grok_api(task)
             trace["model_output"] = output
         except Exception as e:
             trace = handler.classify_and_recover(task, str(e), trace)
-        trace["performance_efficiency"]["latency_ms"] = int((time.time() - start_time) * 1000) + 500  # Simulate ~500ms API latency
-        metrics = evaluate_metrics(task, trace)
+        perf["latency_ms"] = ns_to_ms(time.perf_counter_ns() - start)
+        with span(perf, METRIC_EVALUATION):
+            metrics = evaluate_metrics(task, trace)
         results.append({"id": task["id"], "output": trace.get("model_output", trace.get("fallback_used", "[error]")), "metrics": metrics, "trace": trace})
     with open("results.jsonl", "w") as f:
         for result in results:
@@ -1,11 +1,23 @@
 
 # run_harness_recovery.py
-import json, time, argparse
+import json, os, time, argparse
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from error_recovery_handler import ErrorRecoveryHandler, DummyModelClient
+from response_cache import ResponseCache, CachingModelClient
+from http_model_client import HTTPModelClient
+from trace_spans import span, ns_to_ms, MODEL_CALL
+from profiling import RunProfiler, add_profile_args
+from results_store import open_results_writer
+from checkpoint import RunCheckpoint, add_checkpoint_args, skip_done
+from sharding import add_shard_args, format_shard, select_shard, shard_stats_path
+from blob_store import BlobWriter, add_blob_args
 
-def load_tasks(path: str):
+def load_tasks(path: str, key: Optional[bytes] = None):
+    if key is not None:
+        from security_utils2 import iter_jsonl_records  # chunked encrypted task files
+        yield from iter_jsonl_records(path, key)
+        return
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             if line.strip():
@@ -13,44 +25,121 @@ def load_tasks(path: str):
 
 def simulate_with_recovery(task: Dict[str, Any], handler: ErrorRecoveryHandler) -> Dict[str, Any]:
     trace = {"performance_efficiency": {"latency_ms": 0}}
-    start = time.time()
+    perf = trace["performance_efficiency"]
+    start = time.perf_counter_ns()
     try:
         # Initial attempt
-        output = handler.model_client.call(task)
+        with span(perf, MODEL_CALL):
+            output = handler.call_model(task)
         trace["model_output"] = output
-        trace["performance_efficiency"]["latency_ms"] = int((time.time() - start) * 1000)
+        perf["latency_ms"] = ns_to_ms(time.perf_counter_ns() - start)
         trace["error_recovery_pattern"] = "none"
         trace["recovery_outcome"] = "N/A"
         return trace
     except Exception as e:
         trace["exception"] = type(e).__name__
-        trace["performance_efficiency"]["latency_ms"] = int((time.time() - start) * 1000)
+        perf["latency_ms"] = ns_to_ms(time.perf_counter_ns() - start)
         return handler.classify_and_recover(task, type(e).__name__, trace)
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--tasks", default="tasks.jsonl")
     ap.add_argument("--out", default="results_recovery.jsonl")
+    ap.add_argument("--out_format", choices=["jsonl", "columnar"], default="jsonl",
+                    help="columnar: --out is a directory with the JSONL rows plus NumPy metric columns")
     ap.add_argument("--simulate_errors", action="store_true")
+    ap.add_argument("--all_tasks", action="store_true", help="run every task, not just the three demo ids")
+    ap.add_argument("--endpoint", default=None, help="HTTP model endpoint (e.g. stub_model_server.py) instead of the dummy client")
+    ap.add_argument("--pool_size", type=int, default=8)
+    ap.add_argument("--timeout_s", type=float, default=30.0)
+    ap.add_argument("--config", default=None, help="config_recovery.yaml with weights, limits and retry scheduling")
+    ap.add_argument("--cache", default=None, help="directory of cached model responses keyed by task payload")
+    ap.add_argument("--cache_max_mb", type=int, default=1024)
+    ap.add_argument("--key_file", default=None, help="Fernet key for a chunked encrypted tasks file")
+    ap.add_argument("--recovery_log", default=None, help="write the recovery audit log to this path")
+    ap.add_argument("--embedding_cache", default=None, help="directory for persisted constraint embeddings")
+    ap.add_argument("--embedding_socket", default=os.environ.get("EMBEDDING_SOCKET"),
+                    help="embedding_service.py socket for fairness audits (default $EMBEDDING_SOCKET); "
+                         "falls back to loading the encoder in-process if it is unreachable")
+    ap.add_argument("--stats_out", default=None,
+                    help="recovery stats path (default recovery_stats.json, or recovery_stats.<i>-of-<N>.json with --shard)")
+    add_profile_args(ap)
+    add_checkpoint_args(ap)
+    add_shard_args(ap)
+    add_blob_args(ap)
     args = ap.parse_args()
+    stats_path = args.stats_out or shard_stats_path(args.shard)
 
     # Simulate failures for a subset by id
     error_map = {}
     if args.simulate_errors:
         error_map = {"MSR-001": "RuntimeError", "CPG-001": "ConstraintViolation"}
 
-    handler = ErrorRecoveryHandler(model_client=DummyModelClient(error_map=error_map), rng_seed=42, fairness_check=True)
+    if args.endpoint:
+        client = HTTPModelClient(args.endpoint, pool_size=args.pool_size, timeout_s=args.timeout_s)
+    else:
+        client = DummyModelClient(error_map=error_map)
+    cache = ResponseCache(args.cache, args.cache_max_mb << 20) if args.cache else None
+    if cache is not None:
+        client = CachingModelClient(client, cache)
+    ckpt = RunCheckpoint.from_args(args, args.out)
+    state = ckpt.load(args.tasks, format_shard(args.shard)) if args.resume else None
+    # Outputs, traces and fallbacks repeat across tasks and retries: store each once in <out>.blobs
+    blobs = BlobWriter.from_args(args, args.out, resume=state is not None)
+    handler_kwargs = dict(model_client=client, fairness_check=True, blob_store=blobs,
+                          embedding_cache_dir=args.embedding_cache, embedding_socket=args.embedding_socket)
+    if args.config:
+        handler = ErrorRecoveryHandler.from_config(args.config, **handler_kwargs)
+    else:
+        handler = ErrorRecoveryHandler(rng_seed=42, **handler_kwargs)
 
-    with open(args.out, "w", encoding="utf-8") as outf:
-        for task in load_tasks(args.tasks):
-            if task.get("id") in ("AFV-001","MSR-001","CPG-001"):
+    key = open(args.key_file, "rb").read().strip() if args.key_file else None
+    done, logged, last_id = 0, 0, None
+    if state:
+        done, last_id = state["tasks_done"], state["last_id"]
+        if ckpt.log_path.exists():
+            os.truncate(ckpt.log_path, state["recovery_log_bytes"])
+        handler.restore_state(state["handler"], str(ckpt.log_path))
+        logged = len(handler.recovery_log)
+        print(f"Resuming after {done} tasks")
+
+    def save_checkpoint(complete=False):
+        # Blobs, then results, then the audit log sidecar, then the checkpoint that points into them
+        nonlocal logged
+        if blobs is not None:
+            blobs.sync()
+        offset = writer.sync()
+        handler.write_recovery_log(str(ckpt.log_path), start=logged)
+        logged = len(handler.recovery_log)
+        ckpt.save(args.tasks, done, offset, complete, last_id=last_id, shard=format_shard(args.shard),
+                  recovery_log_bytes=ckpt.log_path.stat().st_size, handler=handler.checkpoint_state())
+
+    with RunProfiler.from_args(args, args.out) as profiler, \
+            open_results_writer(args.out, args.out_format, state["results_offset"] if state else None) as writer:
+        for task in profiler.iter_units(skip_done(select_shard(load_tasks(args.tasks, key), args.shard), state)):
+            if args.all_tasks or task.get("id") in ("AFV-001","MSR-001","CPG-001"):
                 trace = simulate_with_recovery(task, handler)
                 record = {"id": task["id"], "task_set": task["task_set"], "trace": trace, "last_output": trace.get("model_output", "")}
-                outf.write(json.dumps(record) + "\n")
+                with profiler.phase("write_output"):
+                    writer.write(blobs.externalize(record) if blobs is not None else record)
+            done, last_id = done + 1, task.get("id")
+            if ckpt.due(done):
+                save_checkpoint()
+        if ckpt.every > 0:
+            save_checkpoint(complete=True)
 
     stats = handler.get_recovery_stats()
-    Path("recovery_stats.json").write_text(json.dumps(stats, indent=2), encoding="utf-8")
-    print("Wrote", args.out, "and recovery_stats.json")
+    if args.shard:
+        stats["shard"] = format_shard(args.shard)
+    if args.recovery_log:
+        handler.write_recovery_log(args.recovery_log)
+    Path(stats_path).write_text(json.dumps(stats, indent=2), encoding="utf-8")
+    print("Wrote", args.out, "and", stats_path)
+    if cache is not None:
+        print("Cache:", json.dumps(cache.stats()))
+    if blobs is not None:
+        blobs.close()
+        print("Blobs:", json.dumps(blobs.stats()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,256 @@
+# schema_validator.py
+# Validates task/result JSONL against trace_schema.yaml-style schemas, compiled once into fast checkers
+
+from __future__ import annotations
+import argparse, json, os, sys
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent
+
+# Schema notation (trace_schema.yaml): a mapping is an object whose listed fields are type-checked
+# when present; a one-item list is an array of that item; a string names a type: string, int,
+# float (ints accepted), bool, object, list, any, enum[a, b, ...], or a union "a | b".
+# Object-level keys: `required: [...]` fields that must be present, `optional:` more fields
+# (trace_schemaBC.yaml) and `by_task_set: {<task_set>: <object>}` extra fields/requirements per set.
+_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,), "int": (int,), "float": (int, float), "bool": (bool,),
+    "object": (dict,), "list": (list,),
+}
+_JSON_NAMES = {str: "string", int: "int", float: "float", bool: "bool", dict: "object", list: "list", type(None): "null"}
+
+_ABSENT = object()  # stands in for a missing field; its type() is `object`, which no schema type maps to
+
+Fast = Callable[[Any], bool]
+Explain = Callable[[Any, str, List[str]], None]
+
+
+def _got(v: Any) -> str:
+    return _JSON_NAMES.get(type(v), type(v).__name__)
+
+
+def _compile_type(spec: str) -> Tuple[Fast, Explain]:
+    types: set = set()
+    enums: set = set()
+    anything = False
+    for atom in (a.strip() for a in spec.split("|")):
+        if atom.startswith("enum[") and atom.endswith("]"):
+            enums.update(x.strip() for x in atom[5:-1].split(","))
+        elif atom == "any":
+            anything = True
+        elif atom in _TYPES:
+            types.update(_TYPES[atom])
+        else:
+            raise ValueError(f"unknown schema type {atom!r} in {spec!r}")
+    types_f, enums_f = frozenset(types), frozenset(enums)
+
+    def fast(v: Any) -> bool:
+        # type() rather than isinstance: json gives exact types, and bool must not pass as int
+        return anything or type(v) in types_f or (type(v) is str and v in enums_f)
+
+    def explain(v: Any, where: str, errors: List[str]):
+        if not fast(v):
+            expected = spec if not enums_f or types_f else "one of " + ", ".join(sorted(enums_f))
+            errors.append(f"{where}: expected {expected}, got {_got(v)}"
+                          + (f" {v!r}" if type(v) is str else ""))
+    if not anything and not enums_f:
+        fast.types = types_f  # type: ignore[attr-defined]  # lets objects inline plain type checks
+    return fast, explain
+
+
+def _compile_list(spec: List[Any]) -> Tuple[Fast, Explain]:
+    if len(spec) != 1:
+        raise ValueError(f"array schemas have exactly one item schema, got {spec!r}")
+    item_fast, item_explain = compile_schema(spec[0])
+
+    def fast(v: Any) -> bool:
+        return type(v) is list and all(map(item_fast, v))
+
+    def explain(v: Any, where: str, errors: List[str]):
+        if type(v) is not list:
+            errors.append(f"{where}: expected list, got {_got(v)}")
+            return
+        for i, x in enumerate(v):
+            if not item_fast(x):
+                item_explain(x, f"{where}[{i}]", errors)
+    return fast, explain
+
+
+def _compile_object(spec: Dict[str, Any], strict: bool = False) -> Tuple[Fast, Explain, frozenset]:
+    spec = dict(spec)
+    required = tuple(spec.pop("required", ()) or ())
+    spec.update(spec.pop("optional", None) or {})
+    variants = {k: _compile_object(v, strict) for k, v in (spec.pop("by_task_set", None) or {}).items()}
+    fields = [(k, *compile_schema(v, strict)) for k, v in spec.items()]
+    known = frozenset(spec).union(*(v[2] for v in variants.values()))
+    need = frozenset(required)
+    # Plain-type fields are checked inline (a missing field reads as _ABSENT, whose type is allowed)
+    plain = tuple((k, f.types | {object}) for k, f, _ in fields if hasattr(f, "types"))
+    nested = tuple((k, f) for k, f, _ in fields if not hasattr(f, "types"))
+
+    def fast(v: Any) -> bool:
+        if type(v) is not dict or not need <= v.keys():
+            return False
+        get = v.get
+        for k, types in plain:
+            if type(get(k, _ABSENT)) not in types:
+                return False
+        for k, f in nested:
+            x = get(k, _ABSENT)
+            if x is not _ABSENT and not f(x):
+                return False
+        if variants:
+            tset = v.get("task_set")
+            variant = variants.get(tset) if type(tset) is str else None
+            if variant is not None and not variant[0](v):
+                return False
+        return not strict or all(k in known for k in v)
+
+    def explain(v: Any, where: str, errors: List[str]):
+        if type(v) is not dict:
+            errors.append(f"{where or '$'}: expected object, got {_got(v)}")
+            return
+        for k in required:
+            if k not in v:
+                errors.append(f"{where}.{k}: missing required key")
+        for k, f, e in fields:
+            if k in v and not f(v[k]):
+                e(v[k], f"{where}.{k}", errors)
+        tset = v.get("task_set")
+        variant = variants.get(tset) if type(tset) is str else None
+        if variant is not None:
+            variant[1](v, where, errors)
+        if strict:
+            errors.extend(f"{where}.{k}: unknown key" for k in v if k not in known)
+
+    return fast, explain, known
+
+
+def compile_schema(spec: Any, strict: bool = False) -> Tuple[Fast, Explain]:
+    """(fast, explain): ``fast(v)`` is a cheap bool check; ``explain(v, path, errors)`` appends
+    one message per problem and is only run on values ``fast`` rejected."""
+    if isinstance(spec, dict):
+        return _compile_object(spec, strict)[:2]
+    if isinstance(spec, list):
+        return _compile_list(spec)
+    if isinstance(spec, str):
+        return _compile_type(spec)
+    raise ValueError(f"unsupported schema node: {spec!r}")
+
+
+def load_schema(path: str) -> Dict[str, Any]:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+# Per-process validator, compiled once by the pool initializer (or on first serial use)
+_checker: Optional[Tuple[Fast, Explain]] = None
+
+
+def _init_worker(schema_path: str, strict: bool):
+    global _checker
+    _checker = compile_schema(load_schema(schema_path), strict)
+
+
+def validate_lines(lines: Iterator[bytes], first_line: int = 1) -> Tuple[int, List[Tuple[int, str]]]:
+    """(lines read, [(line number, message), ...]) for JSONL ``lines``; blank lines are skipped."""
+    fast, explain = _checker
+    errors: List[Tuple[int, str]] = []
+    loads = json.loads
+    n = 0
+    for n, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            obj = loads(line)
+        except ValueError as e:
+            errors.append((n, f"invalid JSON: {e}"))
+            continue
+        if not fast(obj):
+            found: List[str] = []
+            explain(obj, "", found)
+            errors.extend((n, msg.lstrip(".")) for msg in found or ["invalid record"])
+    return n - first_line + 1 if n else 0, errors
+
+
+def _validate_chunk(span: Tuple[str, int, int]) -> Tuple[int, List[Tuple[int, str]]]:
+    # Line numbers are chunk-relative here; validate_file shifts them by the lines before the chunk
+    path, start, end = span
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    return validate_lines(iter(lines))
+
+
+def _chunks(path: str, chunk_bytes: int) -> List[Tuple[str, int, int]]:
+    """Byte ranges of ``path`` of about ``chunk_bytes`` each, ending on line boundaries."""
+    size = os.path.getsize(path)
+    spans, start = [], 0
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            spans.append((path, start, end))
+            start = end
+    return spans
+
+
+def validate_file(path: str, schema_path: str = str(ROOT / "trace_schema.yaml"), workers: int = 1,
+                  chunk_bytes: int = 8 << 20, strict: bool = False) -> Iterator[Tuple[int, str]]:
+    """Yield ``(line, message)`` for every problem in ``path`` (JSONL or a columnar store), in file order.
+
+    Workers each read their own byte range, so memory stays at ``workers * chunk_bytes`` whatever the
+    file size; a malformed line is reported and validation carries on with the next one.
+    """
+    if os.path.isfile(os.path.join(path, "meta.json")):  # results_store.is_columnar, without numpy
+        path = os.path.join(path, "rows.jsonl")
+    spans = _chunks(path, chunk_bytes)
+    offset = 0
+    if workers > 1 and len(spans) > 1:
+        with Pool(min(workers, len(spans)), _init_worker, (schema_path, strict)) as pool:
+            for n, errors in pool.imap(_validate_chunk, spans):
+                for line, msg in errors:
+                    yield offset + line, msg
+                offset += n
+        return
+    _init_worker(schema_path, strict)
+    for span in spans:
+        n, errors = _validate_chunk(span)
+        for line, msg in errors:
+            yield offset + line, msg
+        offset += n
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Validate task/result JSONL files (or columnar stores) against a schema")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--schema", default=str(ROOT / "trace_schema.yaml"),
+                    help="trace_schema.yaml for results, task_schema.yaml for task files")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk_mb", type=float, default=8.0, help="bytes of JSONL per worker job")
+    ap.add_argument("--strict", action="store_true", help="also reject keys the schema doesn't list")
+    ap.add_argument("--max_errors", type=int, default=0, help="stop after N errors per file (0 = report all)")
+    args = ap.parse_args(argv)
+    compile_schema(load_schema(args.schema), args.strict)  # fail fast on a bad schema, before any workers start
+    failed = False
+    for path in args.files:
+        count = 0
+        for line, msg in validate_file(path, args.schema, args.workers, max(1, int(args.chunk_mb * (1 << 20))), args.strict):
+            print(f"[L{line}] {path}: {msg}", file=sys.stderr)
+            count += 1
+            if count == args.max_errors:
+                print(f"{path}: stopping after {count} errors", file=sys.stderr)
+                break
+        failed = failed or count > 0
+        print(f"{path}: {'%d error(s)' % count if count else 'OK'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
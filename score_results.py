@@ -1,70 +1,381 @@
-import argparse, json, re
+import argparse, hashlib, json
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
 from statistics import mean
+from eval_utilsUpdate2 import LiteralMatcher
+from stats_utils import RunningStats
+from profiling import RunProfiler, add_profile_args
+from blob_store import is_ref, open_blob_reader
 
-def load_jsonl(path):
+SUMMARY_METRICS = ("determinism_index", "hallucination_rate", "source_prioritization_accuracy")
+# --incremental sidecar; bump the version whenever score_row's output for a given row/task changes
+MANIFEST_FORMAT = "scores-manifest"
+MANIFEST_VERSION = 1
+
+def load_jsonl(path, key=None):
+    if key is not None:
+        return list(iter_jsonl(path, key))
+    if is_columnar(path):
+        return list(iter_jsonl(path))
     with open(path, "r", encoding="utf-8") as f:
         return [json.loads(line) for line in f if line.strip()]
 
+def is_columnar(path, key=None):
+    # results_store.is_columnar, without importing NumPy for plain JSONL runs
+    return key is None and (Path(path) / "meta.json").is_file()
+
+def iter_jsonl(path, key=None):
+    if key is not None:
+        # Chunked encrypted inputs are decrypted segment by segment; no plaintext temp file
+        from security_utils2 import iter_jsonl_records
+        yield from iter_jsonl_records(path, key)
+        return
+    if is_columnar(path):
+        from results_store import ColumnarResults
+        yield from ColumnarResults(path).iter_rows()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_jsonl_text(path, key=None):
+    """(row text, row or None) pairs; the text is the file's own line where there is one, so
+    callers that only hash rows can skip parsing them."""
+    if key is not None:
+        for r in iter_jsonl(path, key):
+            yield json.dumps(r), r
+        return
+    if is_columnar(path):
+        from results_store import ColumnarResults
+        yield from ((line, None) for line in ColumnarResults(path).iter_lines() if line.strip())
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.rstrip("\n"), None
+
 def build_task_map(tasks):
     return {t["id"]: t for t in tasks}
 
-def find_titles_in_text(titles, text):
-    hits = []
-    for t in titles:
-        # Exact title mention (case-insensitive), escape regex specials
-        pat = re.escape(t)
-        if re.search(pat, text, flags=re.IGNORECASE):
-            hits.append(t)
-    return hits
+def build_compact_task_map(tasks):
+    # Keep only the fields scoring reads, so large task files don't dominate RSS in --stream mode
+    task_map = {}
+    for t in tasks:
+        entry = {"task_set": t.get("task_set")}
+        if "sources" in t:
+            entry["sources"] = [{"title": s["title"]} for s in t["sources"]]
+        if "authoritative_source" in t:
+            entry["authoritative_source"] = t["authoritative_source"]
+        task_map[t["id"]] = entry
+    return task_map
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--tasks", required=True)
-    ap.add_argument("--results", required=True)
-    ap.add_argument("--out", default="scores.json")
-    args = ap.parse_args()
+@lru_cache(maxsize=8192)
+def title_matcher(titles):
+    # One compiled case-insensitive matcher per distinct source-title tuple, reused across rows
+    return LiteralMatcher(list(titles), ignore_case=True)
+
+def find_titles_in_text(titles, text, with_offsets=False):
+    # Exact title mention (case-insensitive); same hits as a re.search(re.escape(t), IGNORECASE) per title
+    found = title_matcher(tuple(titles)).find(text, with_offsets=with_offsets)
+    if with_offsets:
+        return found
+    found = set(found)
+    return [t for t in titles if t in found]
+
+def source_prioritization(t, referenced, last_output, trace):
+    titles = [s["title"] for s in t.get("sources", [])]
+    auth = t.get("authoritative_source", "")
+    # Preferred: referenced_sources array (exact titles)
+    referenced = referenced or []
+    # Fallback: parse from output+trace
+    if not referenced:
+        referenced = find_titles_in_text(titles, (last_output or "") + " " + (trace or ""))
+    return 1.0 if auth and (auth in referenced) else 0.0
+
+def score_row(r, task_map, blobs=None):
+    # blobs: the results' blob_store sidecar reader; {"$blob": ...} references are only read back
+    # where the text itself is scored (a reference is truthy, as is every value large enough to be one)
+    tid = r.get("id")
+    t = task_map.get(tid, {})
+    tset = r.get("task_set", t.get("task_set", "UNKNOWN"))
+    metrics = r.get("metrics", {})
+    last_output = r.get("last_output", r.get("output", ""))
+    # Try to retrieve a reasoning trace if present
+    trace = r.get("trace", "")
+    # Some runners may store trace under metrics; leave as-is if missing
+    if isinstance(trace, dict) and not is_ref(trace):
+        # Recovery harness rows carry a structured trace; timings live in its performance_efficiency
+        if "performance_efficiency" in trace:
+            metrics.setdefault("performance_efficiency", trace["performance_efficiency"])
+        trace = trace.get("reasoning_trace", "")
+
+    spa = None
+    if tset == "Adversarial Fact Verification":
+        if blobs is not None:
+            last_output, trace = blobs.resolve(last_output), blobs.resolve(trace)
+        spa = source_prioritization(t, r.get("referenced_sources"), last_output, trace)
+        metrics["source_prioritization_accuracy"] = spa
+
+    # Transparency proxy
+    if "reasoning_transparency" not in metrics:
+        metrics["reasoning_transparency"] = "present" if trace else "missing"
+
+    return {
+        "id": tid,
+        "task_set": tset,
+        "metrics": metrics
+    }
+
+def _row_values(metrics):
+    # (stat, value) pairs SetAccumulator.add takes from one row's metrics
+    for k in SUMMARY_METRICS:
+        v = metrics.get(k)
+        if isinstance(v, (int, float)):
+            yield k, v
+    v = metrics.get("performance_efficiency", {}).get("latency_ms")
+    if isinstance(v, (int, float)):
+        yield "latency_ms", v
+
+def _latency_summary(stats):
+    q = stats.sketch.quantile
+    return {"count": stats.count, "p50": q(0.50), "p90": q(0.90), "p99": q(0.99), "max": stats.max}
+
+class LatencyAccumulator:
+    """End-to-end latency and per-phase span durations (ms) in mergeable quantile sketches."""
+    def __init__(self):
+        self.total = RunningStats()
+        self.phases = {}
+
+    def add(self, perf):
+        v = perf.get("latency_ms")
+        if isinstance(v, (int, float)):
+            self.total.add(v)
+        for sp in perf.get("spans") or ():
+            stats = self.phases.get(sp["name"])
+            if stats is None:
+                stats = self.phases[sp["name"]] = RunningStats()
+            stats.add(sp["duration_ns"] / 1e6)
+
+    def merge(self, other):
+        self.total.merge(other.total)
+        for name, stats in other.phases.items():
+            self.phases.setdefault(name, RunningStats()).merge(stats)
+
+    def patch(self, perf, remove=False):
+        v = perf.get("latency_ms")
+        if isinstance(v, (int, float)):
+            if remove:
+                self.total.remove(v)
+            else:
+                self.total.add_unordered(v)
+        for sp in perf.get("spans") or ():
+            stats = self.phases.setdefault(sp["name"], RunningStats())
+            if remove:
+                stats.remove(sp["duration_ns"] / 1e6)
+            else:
+                stats.add_unordered(sp["duration_ns"] / 1e6)
+            if not stats.count:
+                del self.phases[sp["name"]]
+
+    def stale(self):
+        return self.total.extremes_stale or any(s.extremes_stale for s in self.phases.values())
+
+    def reset_extremes(self, perfs, force=False):
+        if force or self.total.extremes_stale:
+            self.total.reset_extremes([v for v in (p.get("latency_ms") for p in perfs) if isinstance(v, (int, float))])
+        for name, stats in self.phases.items():
+            if force or stats.extremes_stale:
+                stats.reset_extremes([sp["duration_ns"] / 1e6 for p in perfs for sp in p.get("spans") or ()
+                                      if sp["name"] == name])
+
+    def to_dict(self):
+        return {"total": self.total.to_dict(), "phases": [[k, s.to_dict()] for k, s in self.phases.items()]}
+
+    @classmethod
+    def from_dict(cls, d):
+        acc = cls()
+        acc.total = RunningStats.from_dict(d["total"])
+        acc.phases = {k: RunningStats.from_dict(s) for k, s in d["phases"]}
+        return acc
+
+    def summary(self):
+        return {"latency_ms": _latency_summary(self.total),
+                "phases_ms": {name: _latency_summary(s) for name, s in sorted(self.phases.items())}}
+
+class SetAccumulator:
+    """Online per-task-set aggregates; memory is independent of the number of rows."""
+    def __init__(self):
+        self.stats = {k: RunningStats() for k in SUMMARY_METRICS + ("latency_ms",)}
+        self.latency = LatencyAccumulator()
+
+    def add(self, metrics):
+        for k in SUMMARY_METRICS:
+            v = metrics.get(k)
+            if isinstance(v, (int, float)):
+                self.stats[k].add(v)
+        perf = metrics.get("performance_efficiency", {})
+        v = perf.get("latency_ms")
+        if isinstance(v, (int, float)):
+            self.stats["latency_ms"].add(v)
+        self.latency.add(perf)
 
-    tasks = load_jsonl(args.tasks)
-    results = load_jsonl(args.results)
-    task_map = build_task_map(tasks)
+    def merge(self, other):
+        for k, s in other.stats.items():
+            self.stats[k].merge(s)
+        self.latency.merge(other.latency)
+
+    def patch(self, metrics, remove=False):
+        """Add a row that isn't last in row order, or take back a row added earlier. Min/max
+        that may be off afterwards are marked stale; ``reset_extremes`` restores them."""
+        for k, v in _row_values(metrics):
+            if remove:
+                self.stats[k].remove(v)
+            else:
+                self.stats[k].add_unordered(v)
+        self.latency.patch(metrics.get("performance_efficiency", {}), remove)
+
+    def stale(self):
+        return any(s.extremes_stale for s in self.stats.values()) or self.latency.stale()
+
+    def reset_extremes(self, rows, force=False):
+        # rows: the metrics of every row now in the set, in row order
+        for k, stats in self.stats.items():
+            if force or stats.extremes_stale:
+                stats.reset_extremes([v for m in rows for kk, v in _row_values(m) if kk == k])
+        self.latency.reset_extremes([m.get("performance_efficiency", {}) for m in rows], force)
+
+    def to_dict(self):
+        return {"stats": {k: s.to_dict() for k, s in self.stats.items()}, "latency": self.latency.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        acc = cls()
+        acc.stats = {k: RunningStats.from_dict(s) for k, s in d["stats"].items()}
+        acc.latency = LatencyAccumulator.from_dict(d["latency"])
+        return acc
+
+    def summary(self):
+        out = {f"avg_{k}": self.stats[k].mean() for k in SUMMARY_METRICS}
+        out["avg_latency_ms"] = self.stats["latency_ms"].mean()
+        out["distribution"] = {k: s.summary() for k, s in self.stats.items() if s.count}
+        out["latency"] = self.latency.summary()
+        return out
+
+def summarize_columnar(results_path, task_map):
+    """Per-set summaries straight from a columnar store's metric columns; the same result as
+    feeding every row through SetAccumulator. Rows the store flags are scored row by row."""
+    import numpy as np
+    from results_store import ColumnarResults, INT
+    store = ColumnarResults(results_path)
+    blobs = open_blob_reader(results_path)  # rows holding references are fallback rows
+    fallback = np.asarray(store.fallback(), dtype=bool)
+    ids = store.strings("id")
+    # Task set per row: the row's own, else the task file's (as score_row resolves it)
+    names = list(store.task_set_names)
+    codes = np.array(store.task_set_codes(), dtype=np.int64)
+    unresolved = np.flatnonzero((codes < 0) & ~fallback)
+    for i, tid in zip(unresolved.tolist(), ids.take(unresolved)):
+        name = task_map.get(tid, {}).get("task_set", "UNKNOWN")
+        if name not in names:
+            names.append(name)
+        codes[i] = names.index(name)
+    for i in np.flatnonzero(fallback).tolist():
+        name = score_row(store.row(i), task_map, blobs)["task_set"]
+        if name not in names:
+            names.append(name)
+        codes[i] = names.index(name)
+    first = {}
+    for c in np.unique(codes).tolist():
+        first[c] = int(np.argmax(codes == c))
+    span_row, span_name, span_ns = (np.asarray(a) for a in store.spans())
+    by_set = {}
+    for c in sorted(first, key=first.get):
+        tset = names[c]
+        acc = by_set[tset] = SetAccumulator()
+        rows = (codes == c) & ~fallback
+        for k in SUMMARY_METRICS + ("latency_ms",):
+            if k == "source_prioritization_accuracy" and tset == "Adversarial Fact Verification":
+                idx = np.flatnonzero(rows)
+                spa = [source_prioritization(task_map.get(tid, {}), None, out, trace) for tid, out, trace in
+                       zip(ids.take(idx), store.strings("last_output").take(idx), store.strings("trace_text").take(idx))]
+                acc.stats[k].add_array(np.array(spa, dtype=np.float64), np.zeros(len(spa), dtype=bool))
+                continue
+            values, kinds = store.numeric(k)
+            sel = rows & (np.asarray(kinds) > 0)
+            acc.stats[k].add_array(values[sel], kinds[sel] == INT)
+            if k == "latency_ms":
+                acc.latency.total.add_array(values[sel], kinds[sel] == INT)
+        in_set = rows[span_row] if len(span_row) else np.zeros(0, dtype=bool)
+        for name_code in np.unique(span_name[in_set]).tolist():
+            ns = span_ns[in_set & (span_name == name_code)]
+            stats = acc.latency.phases.setdefault(store.span_names[name_code], RunningStats())
+            stats.add_array(ns / 1e6, np.zeros(len(ns), dtype=bool))
+    for i in np.flatnonzero(fallback).tolist():
+        rec = score_row(store.row(i), task_map, blobs)
+        extra = SetAccumulator()
+        extra.add(rec["metrics"])
+        by_set[rec["task_set"]].merge(extra)
+    return {tset: acc.summary() for tset, acc in by_set.items()}
+
+def _indent(text, pad):
+    return text.replace("\n", "\n" + pad)
+
+def score_stream(tasks_path, results_path, out_path, key=None, profiler=None, per_task=True):
+    # Single pass over results: per_task records are written as they are scored, with the
+    # same layout json.dumps(..., indent=2) would produce for the whole document.
+    # A columnar results store is summarized from its metric columns instead of row by row.
+    profiler = profiler or RunProfiler(out_path, enabled=False)
+    with profiler.phase("load_tasks"):
+        task_map = build_compact_task_map(iter_jsonl(tasks_path, key))
+    columnar = is_columnar(results_path, key)
+    blobs = open_blob_reader(results_path)
+    by_set = {}
+    with open(out_path, "w", encoding="utf-8") as outf:
+        outf.write("{")
+        if per_task or not columnar:
+            if per_task:
+                outf.write('\n  "per_task": [')
+            first = True
+            for r in profiler.iter_units(iter_jsonl(results_path, key)):
+                with profiler.phase("score_row"):
+                    rec = score_row(r, task_map, blobs)
+                    if not columnar:
+                        by_set.setdefault(rec["task_set"], SetAccumulator()).add(rec["metrics"])
+                if per_task:
+                    with profiler.phase("write_output"):
+                        outf.write(("\n    " if first else ",\n    ") + _indent(json.dumps(rec, indent=2), "    "))
+                first = False
+            if per_task:
+                outf.write("]," if first else "\n  ],")
+        if columnar:
+            with profiler.phase("summarize_columns"):
+                summary = summarize_columnar(results_path, task_map)
+        else:
+            summary = {tset: acc.summary() for tset, acc in by_set.items()}
+        outf.write('\n  "summary": ' + _indent(json.dumps(summary, indent=2), "  ") + "\n}")
+
+def score_all(tasks_path, results_path, out_path, key=None, profiler=None):
+    profiler = profiler or RunProfiler(out_path, enabled=False)
+    with profiler.phase("load_tasks"):
+        tasks = load_jsonl(tasks_path, key)
+        task_map = build_task_map(tasks)
+    columnar = is_columnar(results_path, key)
+    with profiler.phase("load_results"):
+        results = load_jsonl(results_path, key)
+    blobs = open_blob_reader(results_path)
 
     per_task = []
     by_set = {}
+    latency_by_set = {}
 
-    for r in results:
-        tid = r.get("id")
-        t = task_map.get(tid, {})
-        tset = r.get("task_set", t.get("task_set", "UNKNOWN"))
-        metrics = r.get("metrics", {})
-        last_output = r.get("last_output", r.get("output", ""))
-        # Try to retrieve a reasoning trace if present
-        trace = r.get("trace", "")
-        # Some runners may store trace under metrics; leave as-is if missing
-
-        spa = None
-        if tset == "Adversarial Fact Verification":
-            titles = [s["title"] for s in t.get("sources", [])]
-            auth = t.get("authoritative_source", "")
-            # Preferred: referenced_sources array (exact titles)
-            referenced = r.get("referenced_sources") or []
-            # Fallback: parse from output+trace
-            if not referenced:
-                referenced = find_titles_in_text(titles, (last_output or "") + " " + (trace or ""))
-            spa = 1.0 if auth and (auth in referenced) else 0.0
-            metrics["source_prioritization_accuracy"] = spa
-
-        # Transparency proxy
-        if "reasoning_transparency" not in metrics:
-            metrics["reasoning_transparency"] = "present" if trace else "missing"
-
-        per_task.append({
-            "id": tid,
-            "task_set": tset,
-            "metrics": metrics
-        })
-
-        by_set.setdefault(tset, []).append(metrics)
+    for r in profiler.iter_units(results):
+        with profiler.phase("score_row"):
+            rec = score_row(r, task_map, blobs)
+            per_task.append(rec)
+            by_set.setdefault(rec["task_set"], []).append(rec["metrics"])
+            latency_by_set.setdefault(rec["task_set"], LatencyAccumulator()).add(rec["metrics"].get("performance_efficiency", {}))
 
     # Aggregates
     summary = {}
@@ -72,17 +383,172 @@ def main():
         vals = [m.get(key) for m in items if isinstance(m.get(key), (int, float))]
         return mean(vals) if vals else None
 
-    for tset, ms in by_set.items():
+    for tset, ms in ({} if columnar else by_set).items():
         summary[tset] = {
             "avg_determinism_index": agg_mean(ms, "determinism_index"),
             "avg_hallucination_rate": agg_mean(ms, "hallucination_rate"),
             "avg_source_prioritization_accuracy": agg_mean(ms, "source_prioritization_accuracy"),
-            "avg_latency_ms": agg_mean([m.get("performance_efficiency", {}) for m in ms], "latency_ms")
+            "avg_latency_ms": agg_mean([m.get("performance_efficiency", {}) for m in ms], "latency_ms"),
+            "latency": latency_by_set[tset].summary()
         }
 
+    if columnar:
+        with profiler.phase("summarize_columns"):
+            summary = summarize_columnar(results_path, task_map)
+        for tset_summary in summary.values():
+            del tset_summary["distribution"]
+
     out = {"per_task": per_task, "summary": summary}
-    Path(args.out).write_text(json.dumps(out, indent=2), encoding="utf-8")
+    with profiler.phase("write_output"):
+        Path(out_path).write_text(json.dumps(out, indent=2), encoding="utf-8")
+
+def manifest_path(out_path):
+    return Path(out_path).with_suffix(".manifest.json")
+
+def _digest(text):
+    # Row text as is: key order is part of the content (it is kept in the scored record)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _hash_tasks(rows, hashes):
+    for text, t in rows:
+        t = t if t is not None else json.loads(text)
+        hashes[t["id"]] = _digest(text)
+        yield t
+
+def load_previous_scores(out_path):
+    """(scores text, manifest) from the last --incremental run writing ``out_path``, or None."""
+    try:
+        text = Path(out_path).read_text(encoding="utf-8")
+        manifest = json.loads(manifest_path(out_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if (manifest.get("format") != MANIFEST_FORMAT or manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("scores_digest") != _digest(text)):
+        return None
+    return text, manifest
+
+def score_incremental(tasks_path, results_path, out_path, key=None, profiler=None, distribution=False):
+    """Rescore only result rows whose content or task definition changed since the last
+    incremental run, and patch the per-set summary instead of recomputing it.
+
+    ``<out>.manifest.json`` keeps, per row, a content hash of the result row and of its task,
+    the row's id and task set and where its record sits in the scores file, plus the serialized set
+    accumulators. Rows with an unchanged hash pair reuse their previous record text as is, rows
+    that went away are taken back out of the accumulators and new ones are scored and patched
+    in. The output is identical to a full rescore (``--stream`` summary when ``distribution``).
+    """
+    profiler = profiler or RunProfiler(out_path, enabled=False)
+    task_hashes = {}
+    with profiler.phase("load_tasks"):
+        task_map = build_compact_task_map(_hash_tasks(iter_jsonl_text(tasks_path, key), task_hashes))
+    blobs = open_blob_reader(results_path)
+    previous = load_previous_scores(out_path)
+    old_text, old_rows, old_sets, state, reusable = "", [], [], {}, {}
+    if previous is not None:
+        old_text, manifest = previous
+        old_rows, old_sets = manifest["rows"], manifest["task_sets"]
+        state = {tset: SetAccumulator.from_dict(d) for tset, d in zip(old_sets, manifest["state"])}
+        for i, row in enumerate(old_rows):
+            reusable.setdefault(row[0], deque()).append(i)
+
+    def old_record(i):
+        return json.loads(old_text[old_rows[i][4]:old_rows[i][5]])
+
+    reused = bytearray(len(old_rows))
+    # Per row: (row hash, task hash, id, task set, previous row index or the freshly scored record)
+    rows, added = [], []
+    last_reused, reordered = -1, False
+    for text, r in profiler.iter_units(iter_jsonl_text(results_path, key)):
+        row_hash = _digest(text)
+        hits = reusable.get(row_hash)
+        # An identical row has the same id, so the task check needs no parse
+        if hits and task_hashes.get(old_rows[hits[0]][2], "") == old_rows[hits[0]][1]:
+            i = hits.popleft()
+            reused[i] = 1
+            reordered = reordered or i < last_reused
+            last_reused = i
+            rows.append((row_hash, old_rows[i][1], old_rows[i][2], old_sets[old_rows[i][3]], i))
+            continue
+        r = r if r is not None else json.loads(text)
+        with profiler.phase("score_row"):
+            rec = score_row(r, task_map, blobs)
+        added.append(len(rows))
+        rows.append((row_hash, task_hashes.get(r.get("id"), ""), r.get("id"), rec["task_set"], rec))
+
+    with profiler.phase("patch_summary"):
+        for i, row in enumerate(old_rows):
+            if not reused[i]:
+                state[old_sets[row[3]]].patch(old_record(i)["metrics"], remove=True)
+        for j in added:
+            acc = state.setdefault(rows[j][3], SetAccumulator())
+            if previous is None:
+                acc.add(rows[j][4]["metrics"])
+            else:
+                acc.patch(rows[j][4]["metrics"])
+        # Sets in order of first appearance; min/max whose first occurrence may have moved are rescanned
+        sets = list(dict.fromkeys(row[3] for row in rows))
+        stale = {tset for tset in sets if reordered or state[tset].stale()}
+        if stale:
+            by_set = {tset: [] for tset in stale}
+            for *_, tset, src in rows:
+                if tset in stale:
+                    by_set[tset].append((old_record(src) if isinstance(src, int) else src)["metrics"])
+            for tset in stale:
+                state[tset].reset_extremes(by_set[tset], force=reordered)
+        summary = {tset: state[tset].summary() for tset in sets}
+        if not distribution:
+            for tset_summary in summary.values():
+                del tset_summary["distribution"]
+
+    with profiler.phase("write_output"):
+        # Same text as json.dumps({"per_task": ..., "summary": ...}, indent=2)
+        parts, spans, pos = ['{\n  "per_task": ['], [], len('{\n  "per_task": [')
+        set_index = {tset: k for k, tset in enumerate(sets)}
+        for j, (row_hash, task_hash, tid, tset, src) in enumerate(rows):
+            sep = "\n    " if j == 0 else ",\n    "
+            if isinstance(src, int):
+                rec_text = old_text[old_rows[src][4]:old_rows[src][5]]
+            else:
+                rec_text = _indent(json.dumps(src, indent=2), "    ")
+            parts += (sep, rec_text)
+            pos += len(sep)
+            spans.append([row_hash, task_hash, tid, set_index[tset], pos, pos + len(rec_text)])
+            pos += len(rec_text)
+        parts.append("\n  ]," if rows else "],")
+        parts.append('\n  "summary": ' + _indent(json.dumps(summary, indent=2), "  ") + "\n}")
+        text = "".join(parts)
+        Path(out_path).write_text(text, encoding="utf-8")
+        manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "scores_digest": _digest(text),
+                    "task_sets": sets, "state": [state[tset].to_dict() for tset in sets], "rows": spans}
+        manifest_path(out_path).write_text(json.dumps(manifest), encoding="utf-8")
+    print(f"Rescored {len(added)} of {len(rows)} rows ({len(old_rows) - sum(reused)} removed)")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tasks", required=True)
+    ap.add_argument("--results", required=True)
+    ap.add_argument("--out", default="scores.json")
+    ap.add_argument("--stream", action="store_true",
+                    help="single pass with online per-set accumulators; memory stays flat in the number of results")
+    ap.add_argument("--summary_only", action="store_true",
+                    help="write only the summary (implies --stream); columnar results are never parsed row by row")
+    ap.add_argument("--incremental", action="store_true",
+                    help="rescore only rows changed since the last --incremental run (uses <out>.manifest.json)")
+    ap.add_argument("--key_file", default=None, help="Fernet key for chunked encrypted tasks/results files")
+    add_profile_args(ap)
+    args = ap.parse_args()
+    if args.incremental and args.summary_only:
+        ap.error("--incremental reuses per_task records and can't be combined with --summary_only")
+    key = open(args.key_file, "rb").read().strip() if args.key_file else None
+
+    with RunProfiler.from_args(args, args.out) as profiler:
+        if args.incremental:
+            score_incremental(args.tasks, args.results, args.out, key, profiler, distribution=args.stream)
+        elif args.stream or args.summary_only:
+            score_stream(args.tasks, args.results, args.out, key, profiler, per_task=not args.summary_only)
+        else:
+            score_all(args.tasks, args.results, args.out, key, profiler)
     print(f"Wrote {args.out}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,6 +2,9 @@
 # security_utils.py
 # Encrypt/decrypt JSONL and trace files for secure storage
 
+import json, struct
+from bisect import bisect_right
+from typing import Iterator, List, Optional
 from cryptography.fernet import Fernet
 
 def generate_key() -> bytes:
@@ -22,3 +25,164 @@ def decrypt_file(key: bytes, infile: str, outfile: str):
     dec = f.decrypt(data)
     with open(outfile, 'wb') as fout:
         fout.write(dec)
+
+# --- Chunked container -------------------------------------------------------
+# Layout: MAGIC | segment* | index token | u64 index token length | INDEX_MAGIC
+# segment = u32 token length | Fernet(u64 segment no | u64 first record | plaintext)
+# Each segment holds whole lines (records) up to ~chunk_size bytes and is authenticated on
+# its own; the index (also a Fernet token) maps record numbers to segment offsets.
+
+CHUNK_MAGIC = b"AGICHK1\n"
+INDEX_MAGIC = b"AGIIDX1\n"
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+def is_chunked_file(path: str) -> bool:
+    with open(path, 'rb') as fin:
+        return fin.read(len(CHUNK_MAGIC)) == CHUNK_MAGIC
+
+def encrypt_file_chunked(key: bytes, infile: str, outfile: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Stream ``infile`` into the chunked container; memory use is bounded by ``chunk_size``."""
+    f = Fernet(key)
+    segments = []
+    records = 0
+    with open(infile, 'rb') as fin, open(outfile, 'wb') as fout:
+        fout.write(CHUNK_MAGIC)
+        offset = len(CHUNK_MAGIC)
+
+        def flush(buf: List[bytes]):
+            nonlocal offset, records
+            if not buf:
+                return
+            header = struct.pack(">QQ", len(segments), records)
+            token = f.encrypt(header + b"".join(buf))
+            fout.write(struct.pack(">I", len(token)))
+            fout.write(token)
+            segments.append([offset, len(token), records, len(buf)])
+            offset += 4 + len(token)
+            records += len(buf)
+
+        buf: List[bytes] = []
+        size = 0
+        for line in fin:
+            buf.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                flush(buf)
+                buf, size = [], 0
+        flush(buf)
+        index = f.encrypt(json.dumps({"records": records, "segments": segments}).encode('utf-8'))
+        fout.write(index)
+        fout.write(struct.pack(">Q", len(index)))
+        fout.write(INDEX_MAGIC)
+
+def _split_records(data: bytes) -> List[bytes]:
+    # Same record boundaries as iterating a binary file (b"\n" only, unlike bytes.splitlines)
+    parts = data.split(b"\n")
+    lines = [p + b"\n" for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+class ChunkedReader:
+    """Random access and streaming reads over a chunked container, without a plaintext temp file."""
+
+    def __init__(self, key: bytes, path: str):
+        self._fernet = Fernet(key)
+        self._fin = open(path, 'rb')
+        if self._fin.read(len(CHUNK_MAGIC)) != CHUNK_MAGIC:
+            raise ValueError(f"{path} is not a chunked encrypted file")
+        self._fin.seek(-(8 + len(INDEX_MAGIC)), 2)
+        tail = self._fin.read()
+        if tail[8:] != INDEX_MAGIC:
+            raise ValueError(f"{path} is truncated (missing index)")
+        (index_len,) = struct.unpack(">Q", tail[:8])
+        self._fin.seek(-(8 + len(INDEX_MAGIC) + index_len), 2)
+        index = json.loads(self._fernet.decrypt(self._fin.read(index_len)))
+        self.records = index["records"]
+        self.segments = index["segments"]
+        self._starts = [s[2] for s in self.segments]
+
+    def __len__(self) -> int:
+        return self.records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._fin.close()
+
+    def read_segment(self, n: int) -> List[bytes]:
+        offset, length, first, count = self.segments[n]
+        self._fin.seek(offset)
+        (stored,) = struct.unpack(">I", self._fin.read(4))
+        if stored != length:
+            raise ValueError(f"segment {n} length mismatch")
+        plain = self._fernet.decrypt(self._fin.read(length))
+        seg_no, seg_first = struct.unpack(">QQ", plain[:16])
+        if (seg_no, seg_first) != (n, first):
+            raise ValueError(f"segment {n} is out of place")
+        lines = _split_records(plain[16:])
+        if len(lines) != count:
+            raise ValueError(f"segment {n} record count mismatch")
+        return lines
+
+    def read_record(self, i: int) -> bytes:
+        if not 0 <= i < self.records:
+            raise IndexError(i)
+        n = bisect_right(self._starts, i) - 1
+        return self.read_segment(n)[i - self._starts[n]]
+
+    def iter_records(self) -> Iterator[bytes]:
+        for n in range(len(self.segments)):
+            yield from self.read_segment(n)
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.iter_records()
+
+def decrypt_file_chunked(key: bytes, infile: str, outfile: str):
+    with ChunkedReader(key, infile) as reader, open(outfile, 'wb') as fout:
+        for n in range(len(reader.segments)):
+            fout.writelines(reader.read_segment(n))
+
+def iter_jsonl_records(path: str, key: Optional[bytes] = None) -> Iterator[dict]:
+    """JSON objects from a plain JSONL file or, given ``key``, a chunked encrypted one."""
+    if is_chunked_file(path):
+        if key is None:
+            raise ValueError(f"{path} is encrypted; a key is required")
+        with ChunkedReader(key, path) as reader:
+            for line in reader:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    with open(path, 'r', encoding='utf-8') as fin:
+        for line in fin:
+            if line.strip():
+                yield json.loads(line)
+
+def load_key(path: Optional[str]) -> Optional[bytes]:
+    return open(path, 'rb').read().strip() if path else None
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Chunked encryption for results/trace files")
+    ap.add_argument("command", choices=["keygen", "encrypt", "decrypt"])
+    ap.add_argument("--key_file", required=True)
+    ap.add_argument("--in", dest="infile")
+    ap.add_argument("--out", dest="outfile")
+    ap.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = ap.parse_args()
+    if args.command == "keygen":
+        with open(args.key_file, 'wb') as fout:
+            fout.write(generate_key())
+        return
+    key = load_key(args.key_file)
+    if args.command == "encrypt":
+        encrypt_file_chunked(key, args.infile, args.outfile, args.chunk_size)
+    else:
+        decrypt_file_chunked(key, args.infile, args.outfile)
+
+if __name__ == "__main__":
+    main()
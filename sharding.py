@@ -0,0 +1,148 @@
+# sharding.py
+# --shard i/N task assignment for the harnesses, and `merge` for combining per-shard results and recovery stats
+
+from __future__ import annotations
+import argparse, hashlib, json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """``"i/N"`` -> (i, N) with 0 <= i < N."""
+    try:
+        i, n = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{n - 1}, got {text!r}")
+    return i, n
+
+
+def format_shard(shard: Optional[Tuple[int, int]]) -> Optional[str]:
+    return f"{shard[0]}/{shard[1]}" if shard else None
+
+
+def shard_stats_path(shard: Optional[Tuple[int, int]], default: str = "recovery_stats.json") -> str:
+    # Named like generate_tasks.py shards, so shards sharing a directory don't overwrite each other's stats
+    if shard is None:
+        return default
+    p = Path(default)
+    return str(p.with_name(f"{p.stem}.{shard[0]:05d}-of-{shard[1]:05d}{p.suffix}"))
+
+
+def add_shard_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--shard", type=parse_shard, default=None, metavar="i/N",
+                    help="only run the tasks whose id hashes to shard i of N (0-based); combine shards with "
+                         "`agi-governance-benchmark merge` (sharding.py)")
+
+
+def shard_of(task_id: Any, shards: int) -> int:
+    # blake2b rather than hash(): the assignment must agree across processes, hosts and Python versions
+    digest = hashlib.blake2b(str(task_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def select_shard(tasks: Iterable[Dict[str, Any]], shard: Optional[Tuple[int, int]]) -> Iterator[Dict[str, Any]]:
+    if shard is None:
+        yield from tasks
+        return
+    i, n = shard
+    for task in tasks:
+        if shard_of(task.get("id"), n) == i:
+            yield task
+
+
+def _rows_file(path: str) -> Path:
+    # A columnar store keeps its rows verbatim in rows.jsonl
+    p = Path(path)
+    return p / "rows.jsonl" if (p / "meta.json").is_file() else p
+
+
+def merge_results(paths: List[str], out: str, fmt: str = "jsonl") -> int:
+    """Concatenate per-shard results (JSONL files or columnar stores) into ``out``; returns rows written.
+    Blob sidecars (--blob_store) are merged into ``<out>.blobs``."""
+    from blob_store import blob_path, merge_blobs
+    if any(Path(blob_path(p)).is_file() for p in paths):
+        merge_blobs(paths, out)
+    rows = 0
+    if fmt == "jsonl":
+        with open(out, "wb") as dst:
+            for path in paths:
+                last = b"\n"
+                with open(_rows_file(path), "rb") as src:
+                    for chunk in iter(lambda: src.read(1 << 20), b""):
+                        dst.write(chunk)
+                        rows += chunk.count(b"\n")
+                        last = chunk[-1:]
+                if last != b"\n":  # a shard cut off mid-line still ends its own row
+                    dst.write(b"\n")
+                    rows += 1
+        return rows
+    from results_store import ColumnarResultsWriter
+    with ColumnarResultsWriter(out) as w:
+        for path in paths:
+            with open(_rows_file(path), "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if line.strip():
+                        w.add(json.loads(line), line)
+        return w.rows
+
+
+def merge_stats(paths: List[str], allow_partial: bool = False) -> Dict[str, Any]:
+    """Exact global recovery stats from per-shard recovery_stats.json files (see merge_recovery_stats)."""
+    from error_recovery_handler import merge_recovery_stats
+    stats = [json.loads(Path(p).read_text(encoding="utf-8")) for p in paths]
+    for path, s in zip(paths, stats):
+        if "counts" not in s:
+            raise ValueError(f"{path} has no raw counts (written before sharding support); rerun that shard")
+        if "retry_scheduler" not in s:
+            raise ValueError(f"{path} is not a run_harness_recovery.py stats file (no retry_scheduler section)")
+    shards = [s.get("shard") for s in stats]
+    if all(shards):
+        seen = [parse_shard(s) for s in shards]
+        totals = {n for _, n in seen}
+        if len(totals) != 1:
+            raise ValueError(f"stats come from different shard counts: {sorted(shards)}")
+        n = totals.pop()
+        dupes = sorted(f"{i}/{n}" for i, k in Counter(i for i, _ in seen).items() if k > 1)
+        if dupes:
+            raise ValueError(f"shard(s) {', '.join(dupes)} given more than once")
+        missing = sorted(set(range(n)) - {i for i, _ in seen})
+        if missing and not allow_partial:
+            raise ValueError(f"missing shard(s) {', '.join(f'{i}/{n}' for i in missing)} (--allow_partial to merge anyway)")
+    merged = merge_recovery_stats(stats)
+    merged["shards"] = sorted(shards, key=lambda s: parse_shard(s)[0]) if all(shards) else len(stats)
+    return merged
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge --shard i/N runs: concatenate their results and combine their recovery stats")
+    ap.add_argument("--results", nargs="*", default=[], help="per-shard results (JSONL files or columnar stores), in order")
+    ap.add_argument("--out", default=None, help="merged results path")
+    ap.add_argument("--out_format", choices=["jsonl", "columnar"], default="jsonl")
+    ap.add_argument("--stats", nargs="*", default=[], help="per-shard recovery stats files")
+    ap.add_argument("--stats_out", default="recovery_stats.json")
+    ap.add_argument("--allow_partial", action="store_true", help="merge even if some shards' stats are missing")
+    args = ap.parse_args()
+    if not args.results and not args.stats:
+        ap.error("nothing to merge: pass --results and/or --stats")
+    if args.results and not args.out:
+        ap.error("--results needs --out")
+    merged = None
+    if args.stats:
+        # Validated before any results are written, so a bad shard set leaves nothing half-merged
+        try:
+            merged = merge_stats(args.stats, args.allow_partial)
+        except ValueError as e:
+            ap.error(str(e))
+    if args.results:
+        print(f"Wrote {merge_results(args.results, args.out, args.out_format)} rows to {args.out}")
+    if merged is not None:
+        Path(args.stats_out).write_text(json.dumps(merged, indent=2), encoding="utf-8")
+        print(f"Wrote {args.stats_out}")
+
+
+if __name__ == "__main__":
+    main()
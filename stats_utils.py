@@ -0,0 +1,337 @@
+# stats_utils.py
+# Online, mergeable accumulators for scoring large result files in bounded memory
+
+import math
+from fractions import Fraction
+from typing import Any, Dict, Optional, Tuple
+
+_CHUNK = 1 << 24  # rows per bincount pass; keeps float64 partial sums of 27-bit halves exact
+
+
+def _exact_sum(values) -> Tuple[int, int]:
+    """Exact sum of finite float64 values as ``(S, E)`` meaning S * 2**E."""
+    import numpy as np
+    total, emin = 0, 0
+    parts = []
+    for start in range(0, len(values), _CHUNK):
+        m, e = np.frexp(values[start:start + _CHUNK])
+        mant = (m * 2.0 ** 53).astype(np.int64)      # exact: |mant| < 2**53
+        hi = mant >> 26
+        lo = mant - (hi << 26)                        # 0 <= lo < 2**26
+        exps, inverse = np.unique(e.astype(np.int64) - 53, return_inverse=True)
+        hi_s = np.bincount(inverse, weights=hi, minlength=len(exps))
+        lo_s = np.bincount(inverse, weights=lo, minlength=len(exps))
+        parts += [((int(h) << 26) + int(l), int(x)) for h, l, x in zip(hi_s, lo_s, exps.tolist())]
+    if parts:
+        emin = min(x for _, x in parts)
+        total = sum(v << (x - emin) for v, x in parts)
+    return total, emin
+
+
+def _first_extremes(values, is_int):
+    """First-occurrence min and max as the original Python objects (ints stay ints)."""
+    import numpy as np
+    lo, hi = int(np.argmin(values)), int(np.argmax(values))
+
+    def as_obj(i):
+        return int(values[i]) if is_int[i] else float(values[i])
+
+    return as_obj(lo), as_obj(hi)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch (DDSketch-style) with bounded relative error.
+
+    Memory grows with the log of the value range, not with the number of values,
+    and two sketches built with the same accuracy merge exactly by adding buckets.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, x: float) -> int:
+        return math.ceil(math.log(x) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, x: float, n: int = 1):
+        if x != x:  # NaN carries no rank information
+            return
+        self.count += n
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if x > self.min_value:
+            k = self._key(x)
+            self.pos[k] = self.pos.get(k, 0) + n
+        elif x < -self.min_value:
+            k = self._key(-x)
+            self.neg[k] = self.neg.get(k, 0) + n
+        else:
+            self.zeros += n
+
+    def add_array(self, values, is_int):
+        """Same state as ``add`` for each value in order; ``is_int`` marks values that were ints."""
+        import numpy as np
+        if not len(values):
+            return
+        if not np.isfinite(values).all():
+            for x, i in zip(values.tolist(), is_int.tolist()):
+                self.add(int(x) if i else x)
+            return
+        lo, hi = _first_extremes(values, is_int)
+        self.count += len(values)
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        for mask, store, sign in ((values > self.min_value, self.pos, 1), (values < -self.min_value, self.neg, -1)):
+            x = sign * values[mask]
+            if not len(x):
+                continue
+            r = np.log(x) / self._log_gamma
+            keys = np.ceil(r)
+            # np.log may differ from math.log in the last ulp; recheck values that sit on a bucket edge
+            edge = np.flatnonzero(np.abs(r - np.rint(r)) < 1e-9)
+            for j in edge.tolist():
+                keys[j] = self._key(float(x[j]))
+            for k, c in zip(*np.unique(keys.astype(np.int64), return_counts=True)):
+                store[int(k)] = store.get(int(k), 0) + int(c)
+        self.zeros += int(np.count_nonzero(np.abs(values) <= self.min_value))
+
+    def remove(self, x: float, n: int = 1):
+        """Undo ``add(x, n)``; min/max are left as they are (see RunningStats.remove)."""
+        if x != x:
+            return
+        self.count -= n
+        if x > self.min_value:
+            store, k = self.pos, self._key(x)
+        elif x < -self.min_value:
+            store, k = self.neg, self._key(-x)
+        else:
+            self.zeros -= n
+            return
+        store[k] -= n
+        if not store[k]:
+            del store[k]
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for k, c in other.pos.items():
+            self.pos[k] = self.pos.get(k, 0) + c
+        for k, c in other.neg.items():
+            self.neg[k] = self.neg.get(k, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return min(self.max, max(self.min, -self._value(k)))
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return min(self.max, max(self.min, self._value(k)))
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "pos": {str(k): c for k, c in self.pos.items()},
+            "neg": {str(k): c for k, c in self.neg.items()},
+            "zeros": self.zeros,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "QuantileSketch":
+        sk = cls(d["relative_accuracy"], d["min_value"])
+        sk.pos = {int(k): c for k, c in d["pos"].items()}
+        sk.neg = {int(k): c for k, c in d["neg"].items()}
+        sk.zeros, sk.count = d["zeros"], d["count"]
+        if sk.count:
+            sk.min, sk.max = d["min"], d["max"]
+        return sk
+
+
+class RunningStats:
+    """count/sum/min/max plus a quantile sketch, updated one value at a time.
+
+    The sum is kept as an exact binary fraction, so ``mean()`` returns the same value
+    (and the same int/float type) as ``statistics.mean`` over the full list would.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.count = 0
+        self._num = 0          # exact sum == _num / 2**_shift
+        self._shift = 0
+        self._floats = 0       # the mean/sum stay ints while no float has been added
+        self._inf = self._ninf = self._nan = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.extremes_stale = False
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, x):
+        self._add_exact(x)
+        self.min = x if self.min is None or x < self.min else self.min
+        self.max = x if self.max is None or x > self.max else self.max
+        self.sketch.add(x)
+
+    def add_array(self, values, is_int):
+        """Vectorized ``add`` over a float64 array (``is_int`` marks values that were ints);
+        count, exact sum, min/max and sketch end up exactly as if added one by one."""
+        import numpy as np
+        values = np.asarray(values, dtype=np.float64)
+        is_int = np.asarray(is_int, dtype=bool)
+        if not len(values):
+            return
+        if not np.isfinite(values).all():  # NaN/inf ordering semantics: take the scalar path
+            for x, i in zip(values.tolist(), is_int.tolist()):
+                self.add(int(x) if i else x)
+            return
+        self.count += len(values)
+        self._floats += len(values) - int(np.count_nonzero(is_int))
+        total, exp = _exact_sum(values)
+        if exp + self._shift >= 0:
+            self._num += total << (exp + self._shift)
+        else:
+            self._num <<= -exp - self._shift
+            self._shift = -exp
+            self._num += total
+        lo, hi = _first_extremes(values, is_int)
+        self.min = lo if self.min is None or lo < self.min else self.min
+        self.max = hi if self.max is None or hi > self.max else self.max
+        self.sketch.add_array(values, is_int)
+
+    def add_unordered(self, x):
+        """``add`` for a value that doesn't come after every value already added: min/max
+        keep the first occurrence among equal values (and stick to a leading NaN), so a
+        possible tie marks them stale."""
+        if self._nan or self.min is None or not self.min < x < self.max:
+            self.extremes_stale = True
+        self.add(x)
+
+    def remove(self, x):
+        """Undo an earlier ``add(x)``. Everything but min/max is restored exactly; if ``x``
+        may have been the min or max, ``extremes_stale`` is set (see ``reset_extremes``)."""
+        self._add_exact(x, -1)
+        if self._nan or self.min is None or not self.min < x < self.max:
+            self.extremes_stale = True
+        self.sketch.remove(x)
+
+    def reset_extremes(self, values):
+        """Recompute min/max from every value still added, in their original order."""
+        self.min = self.max = None
+        self.sketch.min, self.sketch.max = math.inf, -math.inf
+        for x in values:
+            self.min = x if self.min is None or x < self.min else self.min
+            self.max = x if self.max is None or x > self.max else self.max
+            if x == x:
+                self.sketch.min = min(self.sketch.min, x)
+                self.sketch.max = max(self.sketch.max, x)
+        self.extremes_stale = False
+
+    def _add_exact(self, x, sign=1):
+        self.count += sign
+        if isinstance(x, float):
+            self._floats += sign
+            if not math.isfinite(x):
+                if x != x:
+                    self._nan += sign
+                elif x > 0:
+                    self._inf += sign
+                else:
+                    self._ninf += sign
+                return
+        n, d = x.as_integer_ratio()
+        k = d.bit_length() - 1
+        if k > self._shift:
+            self._num <<= k - self._shift
+            self._shift = k
+        self._num += sign * n << (self._shift - k)
+
+    @property
+    def _nonfinite(self) -> Optional[float]:
+        # What adding the non-finite values in any order gives
+        if self._nan or (self._inf and self._ninf):
+            return math.nan
+        if self._inf or self._ninf:
+            return math.inf if self._inf else -math.inf
+        return None
+
+    @property
+    def sum(self):
+        if self._nonfinite is not None:
+            return self._nonfinite
+        total = Fraction(self._num, 1 << self._shift)
+        return int(total) if not self._floats else float(total)
+
+    def mean(self):
+        if not self.count:
+            return None
+        if self._nonfinite is not None:
+            return self._nonfinite
+        value = Fraction(self._num, (1 << self._shift) * self.count)
+        return int(value) if not self._floats and value.denominator == 1 else float(value)
+
+    def merge(self, other: "RunningStats"):
+        if other._shift > self._shift:
+            self._num <<= other._shift - self._shift
+            self._shift = other._shift
+        self._num += other._num << (self._shift - other._shift)
+        self.count += other.count
+        self._floats += other._floats
+        self._inf += other._inf
+        self._ninf += other._ninf
+        self._nan += other._nan
+        self.extremes_stale = self.extremes_stale or other.extremes_stale
+        for v in (other.min, other.max):
+            if v is not None:
+                self.min = v if self.min is None or v < self.min else self.min
+                self.max = v if self.max is None or v > self.max else self.max
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> Dict[str, Any]:
+        q = self.sketch.quantile
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "p50": q(0.50), "p90": q(0.90), "p99": q(0.99)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "num": self._num, "shift": self._shift, "floats": self._floats,
+                "inf": self._inf, "ninf": self._ninf, "nan": self._nan, "min": self.min, "max": self.max,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RunningStats":
+        st = cls(d["sketch"]["relative_accuracy"])
+        st.count, st._num, st._shift, st._floats = d["count"], d["num"], d["shift"], d["floats"]
+        st._inf, st._ninf, st._nan = d["inf"], d["ninf"], d["nan"]
+        st.min, st.max = d["min"], d["max"]
+        st.sketch = QuantileSketch.from_dict(d["sketch"])
+        return st
@@ -0,0 +1,129 @@
+# stub_model_server.py
+# Local stand-in model endpoint serving tasks.jsonl answers, with latency and error injection
+
+from __future__ import annotations
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from error_recovery_handler import DummyModelClient
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate_429: float = 0.0,
+                 error_rate_400: float = 0.0, timeout_rate: float = 0.0, timeout_ms: float = 60000.0,
+                 retry_after_s: Optional[int] = 1, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate_429 = error_rate_429
+        self.error_rate_400 = error_rate_400
+        self.timeout_rate = timeout_rate
+        self.timeout_ms = timeout_ms
+        self.retry_after_s = retry_after_s
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    server: "StubModelServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cfg = self.server.config
+        with cfg.lock:
+            r = cfg.rng.random()
+            delay = max(0.0, cfg.latency_ms + cfg.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms))
+        self.server.count_request()
+        try:
+            task = json.loads(body)["task"]
+        except (ValueError, KeyError, TypeError):
+            return self._send(400, {"error": "invalid JSON body"})
+        if r < cfg.timeout_rate:
+            time.sleep(cfg.timeout_ms / 1000)
+            return self._send(504, {"error": "upstream timeout"})
+        r -= cfg.timeout_rate
+        time.sleep(delay / 1000)
+        if r < cfg.error_rate_429:
+            headers = {"Retry-After": str(cfg.retry_after_s)} if cfg.retry_after_s is not None else None
+            return self._send(429, {"error": "rate limited"}, headers)
+        if r - cfg.error_rate_429 < cfg.error_rate_400:
+            return self._send(400, {"error": "bad request"})
+        known = self.server.tasks.get(task.get("id"), task)
+        self._send(200, {"output": self.server.answerer.call(known)})
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], tasks_path: Optional[str], config: StubConfig):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.answerer = DummyModelClient()
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        if tasks_path:
+            with open(tasks_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        t = json.loads(line)
+                        self.tasks[t["id"]] = t
+        self.requests_served = 0
+        self._count_lock = threading.Lock()
+
+    def count_request(self):
+        with self._count_lock:
+            self.requests_served += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(tasks_path: Optional[str] = "tasks.jsonl", host: str = "127.0.0.1", port: int = 0,
+                      **config: Any) -> StubModelServer:
+    """Start a server on a background thread (port 0 picks a free port); stop with .shutdown()."""
+    server = StubModelServer((host, port), tasks_path, StubConfig(**config))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stub model endpoint for load and recovery testing")
+    ap.add_argument("--tasks", default="tasks.jsonl")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency_ms", type=float, default=0.0)
+    ap.add_argument("--jitter_ms", type=float, default=0.0)
+    ap.add_argument("--error_rate_429", type=float, default=0.0)
+    ap.add_argument("--error_rate_400", type=float, default=0.0)
+    ap.add_argument("--timeout_rate", type=float, default=0.0)
+    ap.add_argument("--timeout_ms", type=float, default=60000.0)
+    ap.add_argument("--retry_after_s", type=int, default=1, help="Retry-After sent with 429s (whole seconds)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    cfg = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate_429, args.error_rate_400,
+                     args.timeout_rate, args.timeout_ms, args.retry_after_s, args.seed)
+    server = StubModelServer((args.host, args.port), args.tasks, cfg)
+    print(f"Serving stub model on {server.url}/v1/answer")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
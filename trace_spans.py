@@ -0,0 +1,51 @@
+# trace_spans.py
+# perf_counter_ns phase spans recorded under trace["performance_efficiency"]["spans"]
+
+from __future__ import annotations
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+# Phase names used by the harnesses and ErrorRecoveryHandler; retries are "retry_attempt_<N>"
+MODEL_CALL = "model_call"
+FALLBACK = "fallback"
+FAIRNESS_AUDIT = "fairness_audit"
+METRIC_EVALUATION = "metric_evaluation"
+SECURE_LOGGING = "secure_logging"
+
+
+# Optional per-phase hook (profiling.RunProfiler.phase) entered around every span
+_phase_hook: Optional[Callable[[str], ContextManager[None]]] = None
+
+
+def set_phase_hook(hook: Optional[Callable[[str], ContextManager[None]]]):
+    global _phase_hook
+    _phase_hook = hook
+
+
+def retry_span_name(attempt: int) -> str:
+    return f"retry_attempt_{attempt}"
+
+
+def trace_spans(perf: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return perf.setdefault("spans", [])
+
+
+def add_span(perf: Dict[str, Any], name: str, duration_ns: int):
+    trace_spans(perf).append({"name": name, "duration_ns": duration_ns})
+
+
+@contextmanager
+def span(perf: Dict[str, Any], name: str) -> Iterator[None]:
+    """Time the block into ``perf`` (a performance_efficiency dict); recorded even if it raises."""
+    with _phase_hook(name) if _phase_hook is not None else nullcontext():
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            add_span(perf, name, time.perf_counter_ns() - t0)
+
+
+def ns_to_ms(ns: int) -> int:
+    # latency_ms stays an int (trace schema); rounding instead of truncating keeps sums unbiased
+    return (ns + 500_000) // 1_000_000
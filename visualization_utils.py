@@ -1,35 +1,163 @@
-
 # visualization_utils.py
 # Simple visualization utilities for benchmark metrics
 
-import json
-import matplotlib.pyplot as plt
+import json, textwrap
+from pathlib import Path
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from results_store import ColumnarResults, is_columnar
+
+# Above this many points the hallucination/determinism scatter is drawn as a hexbin density plot
+HEXBIN_THRESHOLD = 50_000
+
+def _metric_column(store: ColumnarResults, name: str):
+    # Missing values read as 0, like m.get(name, 0) on a scored row
+    values, kinds = store.numeric(name)
+    return values * (kinds > 0)
+
+def _latency_by_set(store: ColumnarResults):
+    values, kinds = store.numeric('latency_ms')
+    codes = store.task_set_codes()
+    names = store.task_set_names + ['UNKNOWN']  # rows without a task_set (code -1)
+    task_sets = {}
+    for code in dict.fromkeys(codes.tolist()):
+        sel = (codes == code) & (kinds > 0)
+        if sel.any():
+            task_sets[names[code]] = np.asarray(values[sel])
+    return task_sets
+
+def _latency_stats(values) -> dict:
+    p50, p99 = np.percentile(values, [50, 99])
+    return {'mean': float(np.mean(values)), 'p50': float(p50), 'p99': float(p99), 'count': len(values)}
+
+class ChartData:
+    """Everything the charts need, read from a scores file (parsed once) or a columnar results store.
+
+    ``points`` is (hallucination_rate, determinism_index) per task, or None for a --summary_only
+    scores file; ``latency`` maps task set -> mean/p50/p99/count of latency_ms.
+    """
+
+    def __init__(self, points, latency):
+        self.points = points
+        self.latency = latency
+
+    @classmethod
+    def load(cls, scores_file: str) -> "ChartData":
+        if is_columnar(scores_file):
+            store = ColumnarResults(scores_file)
+            points = (_metric_column(store, 'hallucination_rate'), _metric_column(store, 'determinism_index'))
+            latency = {k: _latency_stats(v) for k, v in _latency_by_set(store).items()}
+            return cls(points, latency)
+        with open(scores_file, 'r') as f:
+            data = json.load(f)
+        if 'per_task' not in data:
+            # --summary_only: no per-task points, but the summary has the latency percentiles
+            latency = {}
+            for ts, s in data.get('summary', {}).items():
+                lat = s.get('latency', {}).get('latency_ms', {})
+                if lat.get('count'):
+                    latency[ts] = {'mean': s.get('avg_latency_ms'), 'p50': lat['p50'], 'p99': lat['p99'],
+                                   'count': lat['count']}
+            return cls(None, latency)
+        per_task = data['per_task']
+        xs = np.fromiter((t['metrics'].get('hallucination_rate', 0) for t in per_task), dtype=float, count=len(per_task))
+        ys = np.fromiter((t['metrics'].get('determinism_index', 0) for t in per_task), dtype=float, count=len(per_task))
+        task_sets = {}
+        for t in per_task:
+            lat = t['metrics'].get('performance_efficiency', {}).get('latency_ms', None)
+            if lat is not None:
+                task_sets.setdefault(t['task_set'], []).append(lat)
+        return cls((xs, ys), {k: _latency_stats(v) for k, v in task_sets.items() if v})
+
+def draw_hallucination_vs_determinism(ax, data: ChartData, hexbin_threshold: int = HEXBIN_THRESHOLD):
+    xs, ys = data.points
+    if len(xs) > hexbin_threshold:
+        ok = np.isfinite(xs) & np.isfinite(ys)
+        hb = ax.hexbin(xs[ok], ys[ok], gridsize=60, bins='log', mincnt=1, cmap='viridis')
+        ax.figure.colorbar(hb, ax=ax, label='tasks (log)')
+    else:
+        ax.scatter(xs, ys)
+    ax.set_xlabel('Hallucination Rate')
+    ax.set_ylabel('Determinism Index')
+    ax.set_title('Hallucination vs Determinism')
+
+def draw_latency(ax, data: ChartData):
+    names = list(data.latency)
+    stats = [data.latency[k] for k in names]
+    pos = np.arange(len(names))
+    ax.bar(pos, [s['mean'] or 0 for s in stats], label='mean')
+    p50 = np.array([s['p50'] for s in stats], dtype=float)
+    p99 = np.array([s['p99'] for s in stats], dtype=float)
+    # Whisker from p50 (marker) up to p99
+    ax.errorbar(pos, p50, yerr=[np.zeros_like(p50), p99 - p50], fmt='o', color='black', capsize=4, label='p50-p99')
+    ax.set_xticks(pos, [textwrap.fill(n, 20) for n in names])  # task set names are long
+    ax.set_ylabel('Latency (ms)')
+    ax.set_title('Latency by Task Set')
+    ax.legend()
+
+def render_all(scores_file: str, out_dir: str, formats=('png',), hexbin_threshold: int = HEXBIN_THRESHOLD,
+               dpi: int = 120):
+    """Render every chart to ``out_dir/<chart>.<format>`` headlessly (Agg), parsing the scores once."""
+    data = ChartData.load(scores_file)
+    charts = []
+    if data.points is not None:  # summary-only scores have no per-task points
+        charts.append(('hallucination_vs_determinism', lambda ax: draw_hallucination_vs_determinism(ax, data, hexbin_threshold)))
+    if data.latency:
+        charts.append(('latency_by_task_set', lambda ax: draw_latency(ax, data)))
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, draw in charts:
+        fig = Figure(figsize=(8, 6))
+        FigureCanvasAgg(fig)  # no pyplot, no display: safe in batch jobs and worker threads
+        draw(fig.add_subplot())
+        fig.tight_layout()
+        for fmt in formats:
+            path = out / f'{name}.{fmt}'
+            fig.savefig(path, format=fmt, dpi=dpi)
+            written.append(str(path))
+    return written
 
 def scatter_hallucination_vs_determinism(scores_file: str):
-    with open(scores_file, 'r') as f:
-        data = json.load(f)
-    xs, ys = [], []
-    for t in data.get('per_task', []):
-        m = t['metrics']
-        xs.append(m.get('hallucination_rate', 0))
-        ys.append(m.get('determinism_index', 0))
-    plt.scatter(xs, ys)
-    plt.xlabel('Hallucination Rate')
-    plt.ylabel('Determinism Index')
-    plt.title('Hallucination vs Determinism')
+    """``scores_file`` is a score_results.py output or a columnar results store (read column-wise)."""
+    data = ChartData.load(scores_file)
+    if data.points is None:
+        raise ValueError(f"{scores_file} has no per-task points (scored with --summary_only); use the latency chart or rescore without it")
+    import matplotlib.pyplot as plt
+    _, ax = plt.subplots()
+    draw_hallucination_vs_determinism(ax, data)
     plt.show()
 
 def bar_latency(scores_file: str):
-    with open(scores_file, 'r') as f:
-        data = json.load(f)
-    task_sets = {}
-    for t in data.get('per_task', []):
-        ts = t['task_set']
-        lat = t['metrics'].get('performance_efficiency', {}).get('latency_ms', None)
-        if lat is not None:
-            task_sets.setdefault(ts, []).append(lat)
-    avg = {k: sum(v)/len(v) for k,v in task_sets.items() if v}
-    plt.bar(avg.keys(), avg.values())
-    plt.ylabel('Average Latency (ms)')
-    plt.title('Latency by Task Set')
+    import matplotlib.pyplot as plt
+    _, ax = plt.subplots()
+    draw_latency(ax, ChartData.load(scores_file))
     plt.show()
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Plot benchmark metrics from a scores file or a columnar results store")
+    ap.add_argument("chart", choices=["render", "scatter", "latency"],
+                    help="render: write every chart to --out_dir without a display; scatter/latency: show one interactively")
+    ap.add_argument("scores", help="score_results.py output or a columnar results store")
+    ap.add_argument("--out_dir", default="charts")
+    ap.add_argument("--formats", default="png", help="comma-separated, e.g. png,svg")
+    ap.add_argument("--hexbin_threshold", type=int, default=HEXBIN_THRESHOLD,
+                    help="draw the scatter as a hexbin density plot above this many points")
+    ap.add_argument("--dpi", type=int, default=120)
+    args = ap.parse_args()
+    if args.chart == "render":
+        for path in render_all(args.scores, args.out_dir, [f for f in args.formats.split(",") if f],
+                               args.hexbin_threshold, args.dpi):
+            print(f"Wrote {path}")
+    elif args.chart == "scatter":
+        try:
+            scatter_hallucination_vs_determinism(args.scores)
+        except ValueError as e:
+            ap.error(str(e))
+    else:
+        bar_latency(args.scores)
+
+if __name__ == "__main__":
+    main()